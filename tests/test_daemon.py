@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+from pathlib import Path
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.daemon import load_feeds, refresh_feeds, run_daemon
+from winzig.database import create_db_and_tables, get_engine
+from winzig.models import Feed
+
+
+class FakeClient:
+    def __init__(self, on_fetch=None) -> None:
+        self.on_fetch = on_fetch
+        self.fetched = []
+
+    async def fetch_text(self, url: str) -> str | None:
+        self.fetched.append(url)
+        if self.on_fetch:
+            await self.on_fetch(url)
+
+        return None
+
+
+class DaemonTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.tmp = tempfile.TemporaryDirectory()
+        url = f"sqlite+aiosqlite:///{Path(self.tmp.name) / 'sqlite.db'}"
+        self.engine = get_engine(url)
+        # Stands in for another process, like 'winzig crawl feeds --prune'.
+        self.other_engine = get_engine(url)
+        await create_db_and_tables(self.engine)
+
+        async with AsyncSession(self.engine) as session:
+            session.add_all(
+                [Feed(url="https://a.test/feed"), Feed(url="https://b.test/feed")]
+            )
+            await session.commit()
+
+    async def asyncTearDown(self) -> None:
+        await self.engine.dispose()
+        await self.other_engine.dispose()
+        self.tmp.cleanup()
+
+    async def delete_feed(self, url: str) -> None:
+        async with AsyncSession(self.other_engine) as session:
+            await session.execute(delete(Feed).where(Feed.url == url))
+            await session.commit()
+
+    async def test_load_feeds_skips_deleted_and_reloads_changed_feeds(self):
+        async with AsyncSession(self.engine, expire_on_commit=False) as session:
+            feeds = await load_feeds(session, [1, 2])
+            self.assertEqual(len(feeds), 2)
+
+            await self.delete_feed("https://b.test/feed")
+            async with AsyncSession(self.other_engine) as other:
+                await other.execute(
+                    update(Feed).where(Feed.id == 1).values(title="Renamed")
+                )
+                await other.commit()
+
+            feeds = await load_feeds(session, [1, 2])
+            self.assertEqual([feed.id for feed in feeds], [1])
+            self.assertEqual(feeds[0].title, "Renamed")
+
+            # Refreshing the feeds that are left doesn't touch the deleted row.
+            await refresh_feeds(session, FakeClient(), feeds)
+            self.assertIsNotNone(feeds[0].next_fetch)
+
+    async def test_daemon_drops_feeds_deleted_while_running(self):
+        async def prune(url: str) -> None:
+            if url == "https://a.test/feed":
+                await self.delete_feed("https://b.test/feed")
+
+        client = FakeClient(on_fetch=prune)
+        await run_daemon(self.engine, concurrency=1, once=True, client=client)
+
+        self.assertEqual(client.fetched, ["https://a.test/feed"])
+        async with AsyncSession(self.engine) as session:
+            results = await session.execute(select(Feed.url, Feed.next_fetch))
+            rows = results.all()
+
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0][0], "https://a.test/feed")
+        self.assertIsNotNone(rows[0][1])
+
+
+if __name__ == "__main__":
+    unittest.main()
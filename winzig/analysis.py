@@ -0,0 +1,95 @@
+from typing import Callable
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.models import Occurrence
+from winzig.profiling import traced
+from winzig.settings import get_setting, set_setting
+from winzig.stemmer import stem
+from winzig.utils import normalize_text
+
+# Contractions are split by normalize_text, so only the fragments that are
+# long enough to be indexed are listed (e.g. "don" for "don't").
+ENGLISH_STOP_WORDS = frozenset(
+    """
+    about above after again against all and any are aren because been before
+    being below between both but can cannot could couldn did didn does doesn
+    doing don down during each few for from further had hadn has hasn have
+    haven having her here hers herself him himself his how into isn its itself
+    just more most mustn myself nor not now off once only other ought our ours
+    ourselves out over own same she should shouldn some such than that the
+    their theirs them themselves then there these they this those through too
+    under until very was wasn were weren what when where which while who whom
+    why will with would wouldn you your yours yourself yourselves
+    """.split()
+)
+
+DEFAULT_ANALYZER = "english"
+
+
+def tokenize(text: str) -> list[str]:
+    return normalize_text(text).split()
+
+
+class Analyzer:
+    def __init__(
+        self,
+        name: str,
+        tokenizer: Callable[[str], list[str]] = tokenize,
+        min_length: int = 3,
+        stop_words: frozenset[str] = frozenset(),
+        stemmer: Callable[[str], str] | None = None,
+    ) -> None:
+        self.name = name
+        self.tokenizer = tokenizer
+        self.min_length = min_length
+        self.stop_words = stop_words
+        self.stemmer = stemmer
+
+    @traced("analyze")
+    def __call__(self, text: str) -> list[str]:
+        terms = []
+        for token in self.tokenizer(text):
+            if len(token) < self.min_length or token in self.stop_words:
+                continue
+
+            if self.stemmer:
+                token = self.stemmer(token)
+
+            terms.append(token)
+
+        return terms
+
+
+analyzers: dict[str, Analyzer] = {}
+
+
+def register_analyzer(analyzer: Analyzer) -> None:
+    analyzers[analyzer.name] = analyzer
+
+
+def get_analyzer(name: str) -> Analyzer:
+    if name not in analyzers:
+        raise ValueError(
+            f"Unknown analyzer '{name}'. Available analyzers: {', '.join(analyzers)}"
+        )
+
+    return analyzers[name]
+
+
+async def load_analyzer(session: AsyncSession) -> Analyzer:
+    name = await get_setting(session, "analyzer")
+    if name is None:
+        # Databases created before analyzers were recorded were indexed with
+        # plain lowercased tokens.
+        results = await session.execute(select(Occurrence.id).limit(1))
+        name = "simple" if results.first() else DEFAULT_ANALYZER
+        await set_setting(session, "analyzer", name)
+        await session.commit()
+
+    return get_analyzer(name)
+
+
+register_analyzer(Analyzer("simple"))
+register_analyzer(
+    Analyzer("english", stop_words=ENGLISH_STOP_WORDS, stemmer=stem),
+)
@@ -0,0 +1,2 @@
+from winzig.benchmarks.corpus import Corpus
+from winzig.benchmarks.suite import print_report, run_benchmarks, save_report
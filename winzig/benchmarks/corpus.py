@@ -0,0 +1,94 @@
+import math
+import random
+from datetime import datetime, timedelta
+from html import escape
+from itertools import accumulate
+
+CONSONANTS = "bcdfghjklmnprstvz"
+VOWELS = "aeiou"
+SYLLABLES = [consonant + vowel for consonant in CONSONANTS for vowel in VOWELS]
+
+
+def make_word(rank: int) -> str:
+    # Pronounceable pseudo-words made only of letters, since digits are
+    # stripped by the analyzers. Every word has at least two syllables.
+    syllables = []
+    while True:
+        rank, i = divmod(rank, len(SYLLABLES))
+        syllables.append(SYLLABLES[i])
+        if not rank and len(syllables) > 1:
+            return "".join(syllables)
+
+
+class Corpus:
+    def __init__(
+        self,
+        size: int,
+        vocabulary_size: int = 50_000,
+        exponent: float = 1.1,
+        min_words: int = 50,
+        max_words: int = 400,
+        seed: int = 0,
+    ) -> None:
+        self.size = size
+        self.exponent = exponent
+        self.min_words = min_words
+        self.max_words = max_words
+        self.seed = seed
+
+        self.vocabulary = [make_word(rank) for rank in range(vocabulary_size)]
+        self._cum_weights = list(
+            accumulate(1 / rank**exponent for rank in range(1, vocabulary_size + 1))
+        )
+        self._start_date = datetime(2020, 1, 1)
+
+    def _random(self, post_id: int) -> random.Random:
+        # Posts are generated from their id alone, so the same post is
+        # produced whether it's served over HTTP or written to the database.
+        return random.Random(self.seed * 1_000_003 + post_id)
+
+    def text(self, post_id: int) -> str:
+        rng = self._random(post_id)
+        length = rng.randint(self.min_words, self.max_words)
+        words = rng.choices(self.vocabulary, cum_weights=self._cum_weights, k=length)
+        return " ".join(words)
+
+    def published(self, post_id: int) -> datetime:
+        return self._start_date + timedelta(hours=post_id)
+
+    def url(self, base_url: str, post_id: int) -> str:
+        return f"{base_url}/posts/{post_id}"
+
+    def html(self, post_id: int) -> str:
+        return (
+            f"<html><head><title>Post {post_id}</title></head>"
+            f"<body><main><p>{escape(self.text(post_id))}</p></main></body></html>"
+        )
+
+    def feed(self, base_url: str, post_ids: range) -> str:
+        items = "".join(
+            f"<item><title>Post {post_id}</title>"
+            f"<link>{self.url(base_url, post_id)}</link>"
+            f"<pubDate>{self.published(post_id):%a, %d %b %Y %H:%M:%S} +0000</pubDate></item>"
+            for post_id in post_ids
+        )
+        return (
+            '<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel>'
+            f"<title>Benchmark feed</title><link>{base_url}</link>"
+            f"<description>Synthetic posts</description>{items}</channel></rss>"
+        )
+
+    def queries(self, count: int, max_terms: int = 4) -> list[str]:
+        # Query terms are spread evenly over the ranks on a log scale, so
+        # queries mix common, mid-frequency and rare terms.
+        rng = random.Random(self.seed)
+        max_rank = math.log(len(self.vocabulary))
+        queries = []
+        for _ in range(count):
+            terms = [
+                self.vocabulary[int(math.exp(rng.uniform(0, max_rank))) - 1]
+                for _ in range(rng.randint(1, max_terms))
+            ]
+            queries.append(" ".join(terms))
+
+        return queries
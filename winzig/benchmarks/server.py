@@ -0,0 +1,53 @@
+import socket
+from aiohttp import web
+from winzig.benchmarks.corpus import Corpus
+
+FEED_SIZE = 100
+
+
+def create_app(corpus: Corpus, posts: int) -> web.Application:
+    # Stand-in for the sites being crawled: each feed lists FEED_SIZE posts,
+    # and pages are generated on request from the corpus.
+    async def feed(request: web.Request) -> web.Response:
+        start = int(request.match_info["feed_id"]) * FEED_SIZE
+        if start >= posts:
+            raise web.HTTPNotFound()
+
+        base_url = f"{request.scheme}://{request.host}"
+        post_ids = range(start, min(start + FEED_SIZE, posts))
+        return web.Response(
+            text=corpus.feed(base_url, post_ids), content_type="application/rss+xml"
+        )
+
+    async def post(request: web.Request) -> web.Response:
+        post_id = int(request.match_info["post_id"])
+        if post_id >= posts:
+            raise web.HTTPNotFound()
+
+        return web.Response(text=corpus.html(post_id), content_type="text/html")
+
+    app = web.Application()
+    app.add_routes(
+        [
+            web.get(r"/feeds/{feed_id:\d+}.xml", feed),
+            web.get(r"/posts/{post_id:\d+}", post),
+        ]
+    )
+    return app
+
+
+def feed_urls(base_url: str, posts: int) -> list[str]:
+    feeds = (posts + FEED_SIZE - 1) // FEED_SIZE
+    return [f"{base_url}/feeds/{feed_id}.xml" for feed_id in range(feeds)]
+
+
+async def start_server(app: web.Application) -> tuple[web.AppRunner, str]:
+    # The socket is bound beforehand to get a free port from the OS.
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    host, port = sock.getsockname()
+
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.SockSite(runner, sock).start()
+    return runner, f"http://{host}:{port}"
@@ -0,0 +1,233 @@
+import json
+import os
+import platform
+import statistics
+import tempfile
+import time
+from datetime import datetime, timezone
+from importlib.metadata import PackageNotFoundError, version
+from rich.table import Table
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig import profiling
+from winzig.analysis import load_analyzer
+from winzig.benchmarks.corpus import Corpus
+from winzig.benchmarks.server import create_app, feed_urls, start_server
+from winzig.compression import load_content_codec
+from winzig.crawler import crawl_from_feeds
+from winzig.database import create_db_and_tables, get_engine
+from winzig.domains import extract_domain
+from winzig.http import HttpClient
+from winzig.indexer import reindex_posts
+from winzig.models import Post
+from winzig.search_engine import SearchEngine
+from winzig.tf_idf import recalculate_tf_idf
+from winzig.console import console
+
+LOAD_BASE_URL = "http://benchmark.invalid"
+LOAD_BATCH_SIZE = 5_000
+CRAWL_CONNECTIONS = 32
+
+
+def winzig_version() -> str:
+    try:
+        return version("winzig")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+def summarize_latencies(latencies: list[float]) -> dict:
+    cuts = statistics.quantiles(latencies, n=100, method="inclusive")
+    return {
+        "count": len(latencies),
+        "mean_ms": statistics.fmean(latencies) * 1e3,
+        "p50_ms": cuts[49] * 1e3,
+        "p90_ms": cuts[89] * 1e3,
+        "p99_ms": cuts[98] * 1e3,
+        "max_ms": max(latencies) * 1e3,
+    }
+
+
+async def count_posts(session: AsyncSession) -> int:
+    results = await session.execute(select(func.count()).select_from(Post))
+    return results.scalar()
+
+
+async def benchmark_crawl(session: AsyncSession, corpus: Corpus, posts: int) -> dict:
+    runner, base_url = await start_server(create_app(corpus, posts))
+    try:
+        # Every page comes from the same local host, so the politeness delay
+        # between requests is turned off.
+        client = HttpClient(limit_per_host=CRAWL_CONNECTIONS, request_interval=0)
+        async with client:
+            start = time.perf_counter()
+            await crawl_from_feeds(session, feed_urls(base_url, posts), client=client)
+            elapsed = time.perf_counter() - start
+    finally:
+        await runner.cleanup()
+
+    crawled = await count_posts(session)
+    return {
+        "posts": crawled,
+        "failures": client.report.failures.total(),
+        "seconds": elapsed,
+        "posts_per_second": crawled / elapsed,
+    }
+
+
+async def load_posts(
+    session: AsyncSession, corpus: Corpus, start: int, end: int
+) -> dict:
+    # Crawling the whole corpus over HTTP would take too long for the larger
+    # sizes, so the rest of the posts are written straight to the database.
+    content_codec = await load_content_codec(session)
+    host = extract_domain(LOAD_BASE_URL)
+    results = await session.execute(select(func.max(Post.id)))
+    offset = (results.scalar() or 0) + 1 - start
+
+    began = time.perf_counter()
+    for batch_start in range(start, end, LOAD_BATCH_SIZE):
+        posts = []
+        contents = []
+        for post_id in range(batch_start, min(batch_start + LOAD_BATCH_SIZE, end)):
+            text = corpus.text(post_id)
+            posts.append(
+                (
+                    post_id + offset,
+                    host.domain,
+                    host.host,
+                    host.registered_domain,
+                    corpus.url(LOAD_BASE_URL, post_id),
+                    len(text),
+                    corpus.published(post_id),
+                )
+            )
+            encoded = content_codec.encode(text)
+            contents.append(
+                (
+                    post_id + offset,
+                    encoded["codec"],
+                    encoded["dictionary_id"],
+                    encoded["data"],
+                )
+            )
+
+        conn = await session.connection()
+        await conn.exec_driver_sql(
+            "INSERT INTO posts (id, domain, host, registered_domain, url, length, published) VALUES (?, ?, ?, ?, ?, ?, ?)",
+            posts,
+        )
+        await conn.exec_driver_sql(
+            "INSERT INTO post_contents (post_id, codec, dictionary_id, data) VALUES (?, ?, ?, ?)",
+            contents,
+        )
+        await session.commit()
+
+    return {"posts": end - start, "seconds": time.perf_counter() - began}
+
+
+async def benchmark_queries(session: AsyncSession, corpus: Corpus, count: int) -> dict:
+    search_engine = SearchEngine(session)
+    queries = corpus.queries(count)
+
+    # The first query also loads the document lengths and term dictionary,
+    # so it's reported separately.
+    start = time.perf_counter()
+    await search_engine.search(queries[0], 10)
+    first_query = time.perf_counter() - start
+
+    latencies = []
+    for query in queries:
+        start = time.perf_counter()
+        await search_engine.search(query, 10)
+        latencies.append(time.perf_counter() - start)
+
+    return {
+        "backend": search_engine.backend,
+        "first_query_ms": first_query * 1e3,
+        **summarize_latencies(latencies),
+    }
+
+
+async def run_benchmarks(
+    posts: int,
+    crawl_posts: int,
+    queries: int,
+    vocabulary_size: int = 50_000,
+    seed: int = 0,
+    workers: int | None = None,
+) -> dict:
+    corpus = Corpus(posts, vocabulary_size=vocabulary_size, seed=seed)
+    crawl_posts = min(crawl_posts, posts)
+    results = {}
+
+    with tempfile.TemporaryDirectory(prefix="winzig-bench-") as directory:
+        path = os.path.join(directory, "sqlite.db")
+        engine = get_engine(f"sqlite+aiosqlite:///{path}")
+        if profiling.profiler:
+            profiling.register(engine)
+
+        await create_db_and_tables(engine)
+
+        async with AsyncSession(engine) as session:
+            if crawl_posts:
+                results["crawl"] = await benchmark_crawl(session, corpus, crawl_posts)
+
+            results["load"] = await load_posts(session, corpus, crawl_posts, posts)
+
+            analyzer = await load_analyzer(session)
+            start = time.perf_counter()
+            await reindex_posts(session, analyzer, workers=workers)
+            results["index"] = {"seconds": time.perf_counter() - start}
+
+            start = time.perf_counter()
+            await recalculate_tf_idf(session)
+            results["tf_idf"] = {"seconds": time.perf_counter() - start}
+
+            results["queries"] = await benchmark_queries(session, corpus, queries)
+
+        await engine.dispose()
+        results["database"] = {"size_bytes": os.path.getsize(path)}
+
+    return {
+        "version": winzig_version(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "parameters": {
+            "posts": posts,
+            "crawl_posts": crawl_posts,
+            "queries": queries,
+            "vocabulary_size": vocabulary_size,
+            "zipf_exponent": corpus.exponent,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def save_report(report: dict, output: str) -> None:
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+
+
+def print_report(report: dict) -> None:
+    results = report["results"]
+    table = Table(
+        title=f"winzig {report['version']}, {report['parameters']['posts']} posts"
+    )
+    table.add_column("Benchmark")
+    table.add_column("Result", justify="right")
+
+    if "crawl" in results:
+        table.add_row("Crawl", f"{results['crawl']['posts_per_second']:.0f} posts/s")
+    table.add_row("Index build", f"{results['index']['seconds']:.2f} s")
+    table.add_row("TF-IDF", f"{results['tf_idf']['seconds']:.2f} s")
+
+    queries = results["queries"]
+    table.add_row(
+        f"Queries ({queries['backend']})",
+        f"p50 {queries['p50_ms']:.1f} ms, p90 {queries['p90_ms']:.1f} ms, p99 {queries['p99_ms']:.1f} ms",
+    )
+    table.add_row("Database size", f"{results['database']['size_bytes'] / 1e6:.1f} MB")
+    console.print(table)
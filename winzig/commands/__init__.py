@@ -2,3 +2,9 @@ from winzig.commands.crawl import crawl
 from winzig.commands.search import search
 from winzig.commands.tui import start_tui
 from winzig.commands.export import export
+from winzig.commands.reindex import reindex
+from winzig.commands.compact import compact
+from winzig.commands.bench import bench
+from winzig.commands.daemon import daemon
+from winzig.commands.shards import shards
+from winzig.commands.index import index
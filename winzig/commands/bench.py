@@ -0,0 +1,77 @@
+import asyncio
+import click
+from winzig.benchmarks import print_report, run_benchmarks, save_report
+from winzig.console import console
+
+
+@click.command(
+    name="bench",
+    help="Benchmark crawling, indexing and searching on a synthetic corpus, in a temporary database. Results are written as JSON.",
+)
+@click.option(
+    "-p",
+    "--posts",
+    type=click.IntRange(min=1),
+    default=10_000,
+    show_default=True,
+    help="Number of posts in the corpus (e.g. 10000, 100000 or 1000000).",
+)
+@click.option(
+    "--crawl-posts",
+    type=click.IntRange(min=0),
+    default=1_000,
+    show_default=True,
+    help="Number of posts crawled from a local server. The rest are written directly to the database.",
+)
+@click.option(
+    "-q",
+    "--queries",
+    type=click.IntRange(min=2),
+    default=200,
+    show_default=True,
+    help="Number of queries used to measure search latency.",
+)
+@click.option(
+    "--vocabulary",
+    type=click.IntRange(min=100),
+    default=50_000,
+    show_default=True,
+    help="Number of distinct words in the corpus, with Zipfian frequencies.",
+)
+@click.option(
+    "--seed",
+    type=int,
+    default=0,
+    show_default=True,
+    help="Seed for the corpus and query generator.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes used to build the index. Defaults to the number of CPUs.",
+)
+@click.option(
+    "-o",
+    "--output",
+    type=click.Path(),
+    default="benchmark.json",
+    show_default=True,
+    help="Path for the JSON results.",
+)
+def bench(
+    posts: int,
+    crawl_posts: int,
+    queries: int,
+    vocabulary: int,
+    seed: int,
+    workers: int | None,
+    output: str,
+):
+    report = asyncio.run(
+        run_benchmarks(posts, crawl_posts, queries, vocabulary, seed, workers)
+    )
+    print_report(report)
+    save_report(report, output)
+    console.log(f"[green bold]SUCCESS[/green bold]: Results saved to {output}")
@@ -0,0 +1,45 @@
+import asyncio
+import click
+from winzig.compression import available_codecs
+from winzig.management import compact_database
+from winzig.sharding import get_index_engines
+from winzig.console import console
+
+
+@click.command(
+    name="compact",
+    help="Recompress the stored content of the posts and reclaim unused space in the database.",
+)
+@click.option(
+    "-c",
+    "--codec",
+    type=click.Choice(list(available_codecs()), case_sensitive=False),
+    default=available_codecs()[-1],
+    show_default=True,
+    help="Codec used to compress the content of the posts.",
+)
+@click.option(
+    "--dictionary/--no-dictionary",
+    default=False,
+    show_default=True,
+    help="Train a compression dictionary on the stored posts. Only supported by the 'zstd' codec.",
+)
+@click.option(
+    "--dictionary-size",
+    type=click.IntRange(min=1024),
+    default=112_640,
+    show_default=True,
+    help="Size in bytes of the trained dictionary.",
+)
+@click.pass_context
+def compact(ctx, codec: str, dictionary: bool, dictionary_size: int):
+    if dictionary and codec != "zstd":
+        console.log(
+            "[red bold]ERROR[/red bold]: Compression dictionaries are only supported by the 'zstd' codec"
+        )
+        return
+
+    for engine in get_index_engines(ctx.obj):
+        asyncio.run(
+            compact_database(engine, codec, dictionary_size if dictionary else None)
+        )
@@ -2,18 +2,28 @@ import asyncio
 import click
 from sqlalchemy.ext.asyncio import AsyncSession
 from winzig.crawler import crawl_from_feeds, crawl_links
+from winzig.http import REQUEST_INTERVAL
 from winzig.tf_idf import recalculate_tf_idf
 from winzig.management import get_feeds_from_csv, get_posts_from_csv, remove_empty_feeds
+from winzig.sharding import crawl_shards
 
 
 @click.group(
     invoke_without_command=True,
     help="Crawl and extract content from feeds and posts. If no subcommand is provided, it automatically crawls previously saved feeds by default.",
 )
+@click.option(
+    "--request-interval",
+    type=click.FloatRange(min=0),
+    default=REQUEST_INTERVAL,
+    show_default=True,
+    help="Minimum number of seconds between requests to the same site.",
+)
 @click.pass_context
-def crawl(ctx):
+def crawl(ctx, request_interval: float):
+    ctx.obj["request_interval"] = request_interval
     if ctx.invoked_subcommand is None:
-        asyncio.run(_crawl_feeds(ctx.obj["engine"], [], None, False, True))
+        asyncio.run(_crawl_feeds(ctx.obj, [], None, False, True))
 
 
 @click.command(
@@ -65,13 +75,31 @@ def crawl_feeds(ctx, file, urls, max, prune, fetch):
     if urls:
         feed_urls.extend(urls)
 
-    asyncio.run(_crawl_feeds(ctx.obj["engine"], feed_urls, max, prune, fetch))
+    asyncio.run(_crawl_feeds(ctx.obj, feed_urls, max, prune, fetch))
 
 
-async def _crawl_feeds(engine, urls: list, max: int | None, prune: bool, fetch: bool):
-    async with AsyncSession(engine) as session:
+async def _crawl_feeds(obj, urls: list, max: int | None, prune: bool, fetch: bool):
+    if obj["shards"]:
         if fetch:
-            await crawl_from_feeds(session, urls, max)
+            await crawl_shards(
+                obj["shards"],
+                feed_urls=urls,
+                max=max,
+                request_interval=obj["request_interval"],
+            )
+
+        if prune:
+            for shard in obj["shards"]:
+                async with AsyncSession(shard) as session:
+                    await remove_empty_feeds(session)
+
+        return
+
+    async with AsyncSession(obj["engine"]) as session:
+        if fetch:
+            await crawl_from_feeds(
+                session, urls, max, request_interval=obj["request_interval"]
+            )
             await recalculate_tf_idf(session)
 
         if prune:
@@ -102,12 +130,18 @@ def crawl_posts(ctx, file, urls):
     if urls:
         post_urls.extend(urls)
 
-    asyncio.run(_crawl_posts(ctx.obj["engine"], post_urls))
+    asyncio.run(_crawl_posts(ctx.obj, post_urls))
+
 
+async def _crawl_posts(obj, urls: list):
+    if obj["shards"]:
+        await crawl_shards(
+            obj["shards"], post_urls=urls, request_interval=obj["request_interval"]
+        )
+        return
 
-async def _crawl_posts(engine, urls: list):
-    async with AsyncSession(engine) as session:
-        await crawl_links(session, urls)
+    async with AsyncSession(obj["engine"]) as session:
+        await crawl_links(session, urls, request_interval=obj["request_interval"])
         await recalculate_tf_idf(session)
 
 
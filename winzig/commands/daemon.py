@@ -0,0 +1,60 @@
+import asyncio
+import click
+from winzig.daemon import run_daemon
+from winzig.http import REQUEST_INTERVAL, HttpClient
+from winzig.sharding import get_index_engines
+from winzig.console import console
+
+
+@click.command(
+    name="daemon",
+    help="Keep crawling the saved feeds, each one when it's expected to have new posts, and index new posts as they're found.",
+)
+@click.option(
+    "-c",
+    "--concurrency",
+    type=click.IntRange(min=1),
+    default=8,
+    show_default=True,
+    help="Maximum number of feeds refreshed at once.",
+)
+@click.option(
+    "-m",
+    "--max",
+    type=int,
+    default=None,
+    help="Maximum number of posts to crawl from each feed.",
+)
+@click.option(
+    "--once",
+    is_flag=True,
+    default=False,
+    help="Refresh the feeds that are due and exit, e.g. to run from cron.",
+)
+@click.option(
+    "--request-interval",
+    type=click.FloatRange(min=0),
+    default=REQUEST_INTERVAL,
+    show_default=True,
+    help="Minimum number of seconds between requests to the same site.",
+)
+@click.pass_context
+def daemon(ctx, concurrency: int, max: int | None, once: bool, request_interval: float):
+    engines = get_index_engines(ctx.obj)
+    try:
+        asyncio.run(_daemon(engines, concurrency, max, once, request_interval))
+    except KeyboardInterrupt:
+        console.log("[yellow bold]WARNING[/yellow bold]: Daemon stopped")
+
+
+async def _daemon(
+    engines, concurrency: int, max: int | None, once: bool, request_interval: float
+):
+    # Every shard has its own schedule, but they share the client so the
+    # limits per host apply to all of them.
+    async with HttpClient(request_interval=request_interval) as client:
+        await asyncio.gather(
+            *(run_daemon(engine, concurrency, max, once, client) for engine in engines)
+        )
+
+    client.report.log()
@@ -1,4 +1,5 @@
 import asyncio
+from contextlib import AsyncExitStack
 import click
 from sqlalchemy.ext.asyncio import AsyncSession
 
@@ -8,6 +9,7 @@ from winzig.management import (
     export_posts_to_txt,
     export_posts_to_csv,
 )
+from winzig.sharding import get_index_engines
 
 
 @click.group(
@@ -17,7 +19,7 @@ from winzig.management import (
 @click.pass_context
 def export(ctx):
     if ctx.invoked_subcommand is None:
-        asyncio.run(_export_feeds(ctx.obj["engine"], "csv", "feeds"))
+        asyncio.run(_export_feeds(get_index_engines(ctx.obj), "csv", "feeds"))
 
 
 @click.command(
@@ -43,21 +45,24 @@ def export(ctx):
 )
 @click.pass_context
 def export_feeds(ctx, format: str, output: str):
-    asyncio.run(_export_feeds(ctx.obj["engine"], format, output))
+    asyncio.run(_export_feeds(get_index_engines(ctx.obj), format, output))
 
 
-async def _export_feeds(engine, format: str, output: str):
-    async with AsyncSession(engine) as session:
+async def _export_feeds(engines, format: str, output: str):
+    async with AsyncExitStack() as stack:
+        sessions = [
+            await stack.enter_async_context(AsyncSession(engine)) for engine in engines
+        ]
         if format == "txt":
             if output == "feeds":
                 output = "feeds.txt"
 
-            await export_feeds_to_txt(session, output)
+            await export_feeds_to_txt(sessions, output)
         elif format == "csv":
             if output == "feeds":
                 output = "feeds.csv"
 
-            await export_feeds_to_csv(session, output)
+            await export_feeds_to_csv(sessions, output)
 
 
 @click.command(
@@ -83,21 +88,24 @@ async def _export_feeds(engine, format: str, output: str):
 )
 @click.pass_context
 def export_posts(ctx, format: str, output: str):
-    asyncio.run(_export_posts(ctx.obj["engine"], format, output))
+    asyncio.run(_export_posts(get_index_engines(ctx.obj), format, output))
 
 
-async def _export_posts(engine, format: str, output: str):
-    async with AsyncSession(engine) as session:
+async def _export_posts(engines, format: str, output: str):
+    async with AsyncExitStack() as stack:
+        sessions = [
+            await stack.enter_async_context(AsyncSession(engine)) for engine in engines
+        ]
         if format == "txt":
             if output == "posts":
                 output = "posts.txt"
 
-            await export_posts_to_txt(session, output)
+            await export_posts_to_txt(sessions, output)
         elif format == "csv":
             if output == "posts":
                 output = "posts.csv"
 
-            await export_posts_to_csv(session, output)
+            await export_posts_to_csv(sessions, output)
 
 
 export.add_command(export_feeds)
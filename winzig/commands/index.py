@@ -0,0 +1,78 @@
+import asyncio
+from pathlib import Path
+import click
+from winzig.local_files import WATCH_INTERVAL, index_paths, watch_paths
+from winzig.segment import compile_segment
+from winzig.sharding import get_index_engines
+from winzig.console import console
+
+
+class IndexGroup(click.Group):
+    # 'winzig index PATH' is a shortcut for 'winzig index files PATH'.
+    def parse_args(self, ctx, args):
+        if args and args[0] not in self.commands and args[0] != "--help":
+            args = ["files", *args]
+
+        return super().parse_args(ctx, args)
+
+
+@click.group(
+    name="index",
+    cls=IndexGroup,
+    help="Index local files, or manage the index used to answer searches. 'winzig index PATH' is a shortcut for 'winzig index files PATH'.",
+)
+def index():
+    pass
+
+
+@click.command(
+    name="files",
+    help="Index the Markdown, text and HTML files in the given paths. Files that didn't change since the last run are skipped, and files that were deleted are removed from the index.",
+)
+@click.option(
+    "-w",
+    "--watch",
+    is_flag=True,
+    default=False,
+    help="Keep running and index the files as they change.",
+)
+@click.option(
+    "-i",
+    "--interval",
+    type=click.FloatRange(min=0.1),
+    default=WATCH_INTERVAL,
+    show_default=True,
+    help="Seconds between checks for changes in watch mode.",
+)
+@click.argument(
+    "paths",
+    nargs=-1,
+    required=True,
+    type=click.Path(exists=True, file_okay=True, dir_okay=True),
+)
+@click.pass_context
+def index_files(ctx, paths: tuple[str], watch: bool, interval: float):
+    roots = [Path(path).resolve() for path in paths]
+    engines = get_index_engines(ctx.obj)
+    if not watch:
+        asyncio.run(index_paths(engines, roots))
+        return
+
+    try:
+        asyncio.run(watch_paths(engines, roots, interval))
+    except KeyboardInterrupt:
+        console.log("[yellow bold]WARNING[/yellow bold]: Stopped watching")
+
+
+@click.command(
+    name="compile",
+    help="Write the terms, postings and document lengths to a read-only segment file that searches memory-map instead of querying the database. Segments are ignored once the index changes, until they're compiled again.",
+)
+@click.pass_context
+def compile_index(ctx):
+    for engine in get_index_engines(ctx.obj):
+        asyncio.run(compile_segment(engine))
+
+
+index.add_command(index_files)
+index.add_command(compile_index)
@@ -0,0 +1,83 @@
+import asyncio
+from datetime import datetime
+import click
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.analysis import analyzers, get_analyzer, load_analyzer
+from winzig.indexer import reindex_posts
+from winzig.sharding import get_index_engines
+from winzig.tf_idf import recalculate_tf_idf
+from winzig.console import console
+
+
+@click.command(
+    name="reindex",
+    help="Rebuild the index from the content already stored in the database, without fetching anything.",
+)
+@click.option(
+    "-a",
+    "--analyzer",
+    type=click.Choice(list(analyzers), case_sensitive=False),
+    default=None,
+    help="Analyzer used to split content into terms. Defaults to the one the database was indexed with.",
+)
+@click.option(
+    "-f",
+    "--feed",
+    type=str,
+    multiple=True,
+    help="Only reindex the posts from this feed URL. Can be used multiple times.",
+)
+@click.option(
+    "-s",
+    "--since",
+    type=click.DateTime(),
+    default=None,
+    help="Only reindex the posts published since this date.",
+)
+@click.option(
+    "-w",
+    "--workers",
+    type=click.IntRange(min=1),
+    default=None,
+    help="Number of worker processes used to analyze posts. Defaults to the number of CPUs.",
+)
+@click.option(
+    "--chunk-size",
+    type=click.IntRange(min=1),
+    default=500,
+    show_default=True,
+    help="Number of posts read and analyzed at once.",
+)
+@click.pass_context
+def reindex(
+    ctx,
+    analyzer: str | None,
+    feed: tuple[str],
+    since: datetime | None,
+    workers: int | None,
+    chunk_size: int,
+):
+    for engine in get_index_engines(ctx.obj):
+        asyncio.run(_reindex(engine, analyzer, list(feed), since, workers, chunk_size))
+
+
+async def _reindex(
+    engine,
+    analyzer_name: str | None,
+    feeds: list[str],
+    since: datetime | None,
+    workers: int | None,
+    chunk_size: int,
+):
+    async with AsyncSession(engine) as session:
+        current_analyzer = await load_analyzer(session)
+        analyzer = get_analyzer(analyzer_name) if analyzer_name else current_analyzer
+
+        if (feeds or since) and analyzer is not current_analyzer:
+            console.log(
+                f"[red bold]ERROR[/red bold]: The database is indexed with the '{current_analyzer.name}' analyzer, changing it requires reindexing all the posts"
+            )
+            return
+
+        await reindex_posts(session, analyzer, feeds, since, workers, chunk_size)
+        await recalculate_tf_idf(session)
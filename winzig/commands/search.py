@@ -1,9 +1,15 @@
 import asyncio
+from contextlib import AsyncExitStack
 from typing import Tuple
 import click
-from sqlalchemy.ext.asyncio import AsyncSession
-from winzig.search_engine import SearchEngine
-from winzig.utils import get_top_urls
+from winzig.search_engine import (
+    BACKENDS,
+    SUPPORTED_FILTERS,
+    available_backends,
+    default_backend,
+    parse_date_range,
+)
+from winzig.sharding import get_index_engines, open_search_engine
 from winzig.console import console
 
 
@@ -40,35 +46,85 @@ from winzig.console import console
     help="Maximum number of search results to display.",
     show_default=True,
 )
+@click.option(
+    "--fuzzy/--no-fuzzy",
+    default=True,
+    show_default=True,
+    help="Expand query terms not found in the index to similarly spelled ones. Terms can also use '*' and '?' wildcards (e.g. 'sqlal*').",
+)
+@click.option(
+    "--backend",
+    type=click.Choice(BACKENDS, case_sensitive=False),
+    default=default_backend(),
+    show_default=True,
+    help="Scoring backend. The 'numpy' backend scores all the postings of a term at once and requires NumPy.",
+)
 @click.option(
     "--filter",
     "-f",
     type=str,
     multiple=True,
-    help="Filter search results by 'key=value' pairs.",
+    help="Filter search results by 'key=value' pairs. Supported keys are 'domain', 'feed' and 'published' (e.g. 'published=2024-01-01..2024-03-31').",
 )
 @click.pass_context
-def search(ctx, query: str, k1: float, b: float, n: int, filter: Tuple[str]):
+def search(
+    ctx,
+    query: str,
+    k1: float,
+    b: float,
+    n: int,
+    fuzzy: bool,
+    backend: str,
+    filter: Tuple[str],
+):
     filters = {}
     for f in filter:
-        key, value = f.split("=")
+        key, sep, value = f.partition("=")
+        key = key.strip()
+        if not sep or key not in SUPPORTED_FILTERS:
+            raise click.BadParameter(
+                f"'{f}' is not a valid filter. Supported keys: {', '.join(SUPPORTED_FILTERS)}",
+                param_hint="--filter",
+            )
+
+        if key == "published":
+            try:
+                parse_date_range(value)
+            except ValueError:
+                raise click.BadParameter(
+                    f"'{value}' is not a valid date range. Use 'YYYY-MM-DD..YYYY-MM-DD'",
+                    param_hint="--filter",
+                )
+
         filters[key] = value
 
-    asyncio.run(_search(ctx.obj["engine"], query, k1, b, n, filters))
+    if backend not in available_backends():
+        raise click.BadParameter(
+            f"The '{backend}' backend requires NumPy to be installed",
+            param_hint="--backend",
+        )
+
+    asyncio.run(
+        _search(get_index_engines(ctx.obj), query, k1, b, n, fuzzy, backend, filters)
+    )
 
 
 async def _search(
-    engine,
+    engines,
     query: str,
     k1: float,
     b: float,
     n: int,
+    fuzzy: bool,
+    backend: str,
     filters: dict[str, str],
 ):
-    async with AsyncSession(engine) as session:
-        search_engine = SearchEngine(session, filters=filters, k1=k1, b=b)
-        search_results = await search_engine.search(query)
-        search_results = get_top_urls(search_results, n)
+    async with AsyncExitStack() as stack:
+        search_engine = await open_search_engine(
+            stack, engines, filters=filters, k1=k1, b=b, fuzzy=fuzzy, backend=backend
+        )
+
+        search_results = await search_engine.search(query, n)
 
         for result in search_results:
             console.print(f"- [green]{result}[/green]")
@@ -0,0 +1,47 @@
+import asyncio
+import click
+from winzig.config import Config
+from winzig.sharding import print_shards, split_database
+from winzig.console import console
+
+
+@click.group(
+    name="shards",
+    help="Split the index into several SQLite files that are crawled and searched in parallel.",
+)
+def shards():
+    pass
+
+
+@click.command(
+    name="split",
+    help="Move the feeds and posts of the database into a number of shards.",
+)
+@click.option(
+    "-n",
+    "--count",
+    type=click.IntRange(min=2),
+    default=4,
+    show_default=True,
+    help="Number of shards.",
+)
+@click.pass_context
+def split_shards(ctx, count: int):
+    asyncio.run(split_database(ctx.obj["engine"], Config().shards_dir, count))
+
+
+@click.command(
+    name="info",
+    help="Show the number of feeds and posts in each shard.",
+)
+@click.pass_context
+def shards_info(ctx):
+    if not ctx.obj["shards"]:
+        console.log("[yellow bold]WARNING[/yellow bold]: The index isn't split")
+        return
+
+    asyncio.run(print_shards(ctx.obj["shards"]))
+
+
+shards.add_command(split_shards)
+shards.add_command(shards_info)
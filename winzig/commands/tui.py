@@ -1,6 +1,7 @@
 import asyncio
+from contextlib import AsyncExitStack
 import click
-from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.sharding import get_index_engines, open_search_engine
 from winzig.tui import TuiApp
 
 
@@ -10,10 +11,13 @@ from winzig.tui import TuiApp
 )
 @click.pass_context
 def start_tui(ctx):
-    asyncio.run(_start_tui(ctx.obj["engine"]))
+    asyncio.run(_start_tui(get_index_engines(ctx.obj)))
 
 
-async def _start_tui(engine):
-    async with AsyncSession(engine) as session:
-        tui_app = TuiApp(session, k1=1.5, b=0.75)
+async def _start_tui(engines):
+    async with AsyncExitStack() as stack:
+        search_engine = await open_search_engine(
+            stack, engines, filters={}, k1=1.5, b=0.75
+        )
+        tui_app = TuiApp(search_engine)
         await tui_app.run_async()
@@ -0,0 +1,128 @@
+import time
+import zlib
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.models import CompressionDictionary, Setting
+from winzig.settings import get_setting
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+CODECS = ("none", "zlib", "zstd")
+DEFAULT_CODEC = "zlib"
+
+
+def available_codecs() -> tuple[str, ...]:
+    return CODECS if zstandard is not None else ("none", "zlib")
+
+
+def train_dictionary(samples: list[str], size: int) -> bytes:
+    encoded = [sample.encode("utf-8") for sample in samples]
+    return zstandard.train_dictionary(size, encoded).as_bytes()
+
+
+class ContentCodec:
+    def __init__(
+        self,
+        codec: str = DEFAULT_CODEC,
+        dictionary_id: int | None = None,
+        dictionaries: dict[int, bytes] | None = None,
+    ) -> None:
+        if codec not in available_codecs():
+            raise ValueError(f"The '{codec}' codec is not available")
+
+        self.codec = codec
+        self.dictionary_id = dictionary_id
+        self.dictionaries = dictionaries or {}
+
+        self._zstd_compressor = None
+        self._zstd_decompressors = {}
+
+    def _zstd_dictionary(self, dictionary_id: int | None):
+        if dictionary_id is None:
+            return None
+
+        return zstandard.ZstdCompressionDict(self.dictionaries[dictionary_id])
+
+    def encode(self, content: str) -> dict:
+        data = content.encode("utf-8")
+        dictionary_id = None
+        if self.codec == "zlib":
+            data = zlib.compress(data, 6)
+        elif self.codec == "zstd":
+            if self._zstd_compressor is None:
+                self._zstd_compressor = zstandard.ZstdCompressor(
+                    level=9, dict_data=self._zstd_dictionary(self.dictionary_id)
+                )
+            data = self._zstd_compressor.compress(data)
+            dictionary_id = self.dictionary_id
+
+        return {"codec": self.codec, "dictionary_id": dictionary_id, "data": data}
+
+    def decode(
+        self,
+        codec: str,
+        dictionary_id: int | None,
+        data: bytes,
+        max_length: int | None = None,
+    ) -> str:
+        # With max_length only the beginning of the content is decompressed,
+        # which is all snippets need. The limit is in bytes, so a multibyte
+        # character cut in half is dropped.
+        if codec == "zlib":
+            if max_length is None:
+                data = zlib.decompress(data)
+            else:
+                data = zlib.decompressobj().decompress(data, max_length)
+        elif codec == "zstd":
+            if dictionary_id not in self._zstd_decompressors:
+                self._zstd_decompressors[dictionary_id] = zstandard.ZstdDecompressor(
+                    dict_data=self._zstd_dictionary(dictionary_id)
+                )
+
+            decompressor = self._zstd_decompressors[dictionary_id]
+            if max_length is None:
+                data = decompressor.decompress(data)
+            else:
+                data = decompressor.stream_reader(data).read(max_length)
+        elif max_length is not None:
+            data = data[:max_length]
+
+        return data.decode("utf-8", errors="ignore")
+
+
+async def load_content_codec(session: AsyncSession) -> ContentCodec:
+    codec = await get_setting(session, "compression") or DEFAULT_CODEC
+    dictionary_id = await get_setting(session, "compression_dictionary")
+
+    results = await session.execute(
+        select(CompressionDictionary.id, CompressionDictionary.data)
+    )
+    return ContentCodec(
+        codec,
+        int(dictionary_id) if dictionary_id else None,
+        dict(results.all()),
+    )
+
+
+def load_content_codec_sync(conn) -> ContentCodec:
+    statement = select(Setting.value).where(Setting.key == "compression")
+    codec = conn.execute(statement).scalar() or DEFAULT_CODEC
+    if codec not in available_codecs():
+        codec = DEFAULT_CODEC
+
+    return ContentCodec(codec)
+
+
+def measure_storage(conn) -> tuple[int, float]:
+    # Space used by the database, and the time it takes to scan the metadata
+    # of every post, which is what crawling and exporting do.
+    page_count = conn.exec_driver_sql("PRAGMA page_count").scalar()
+    free_pages = conn.exec_driver_sql("PRAGMA freelist_count").scalar()
+    page_size = conn.exec_driver_sql("PRAGMA page_size").scalar()
+
+    start = time.perf_counter()
+    conn.execute(text("SELECT id, url, domain, length, feed_id FROM posts")).all()
+    return (page_count - free_pages) * page_size, time.perf_counter() - start
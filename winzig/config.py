@@ -15,8 +15,10 @@ class Config:
     def _initialize(self):
         if os.getenv("DEVELOPMENT"):
             self.sqlite_url = "sqlite+aiosqlite:///sqlite.db"
+            self.shards_dir = Path("shards")
             return
 
         self.winzig_dir = Path.home() / ".winzig"
         self.winzig_dir.mkdir(parents=True, exist_ok=True)
         self.sqlite_url = f"sqlite+aiosqlite:///{self.winzig_dir / 'sqlite.db'}"
+        self.shards_dir = self.winzig_dir / "shards"
@@ -1,3 +1,24 @@
+from contextlib import contextmanager
 from rich.console import Console
 
 console = Console()
+
+_active_status = None
+
+
+@contextmanager
+def shared_status(message: str, spinner: str = "earth"):
+    # Only one live display can be shown at a time, so tasks running
+    # concurrently, like the crawls of different shards, share the first one.
+    global _active_status
+    if _active_status is not None:
+        _active_status.update(message)
+        yield _active_status
+        return
+
+    with console.status(message, spinner=spinner) as status:
+        _active_status = status
+        try:
+            yield status
+        finally:
+            _active_status = None
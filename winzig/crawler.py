@@ -1,45 +1,28 @@
 import asyncio
 from collections import Counter
-import aiohttp
+from contextlib import nullcontext
+from datetime import datetime
 import feedparser
-import tldextract
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from selectolax.parser import HTMLParser
-from winzig.models import Feed, Occurrence, Post
-from winzig.utils import normalize_text
-from winzig.console import console
+from winzig.analysis import Analyzer, load_analyzer
+from winzig.compression import ContentCodec, load_content_codec
+from winzig.domains import extract_domain
+from winzig.http import REQUEST_INTERVAL, HttpClient
+from winzig.models import Feed, Occurrence, Post, PostContent
+from winzig.profiling import traced
+from winzig.console import console, shared_status
 
-headers = {
-    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0",
-    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
-    "Accept-Encoding": "gzip, deflate",
-    "Accept-Language": "en-GB,en;q=0.6",
-}
 
-
-async def fetch_content(client: aiohttp.ClientSession, url: str) -> str | None:
-    try:
-        async with client.get(url) as resp:
-            if resp.status >= 400:
-                console.log(
-                    f"[red bold]ERROR[/red bold]: Bad status from '{url}': {resp.status}"
-                )
-                return None
-
-            return await resp.text()
-    except aiohttp.ClientError as e:
-        console.log(f"[red bold]ERROR[/red bold]: Failed to fetch '{url}': {e}")
-        return None
-
-
-def clean_content(html: str) -> str:
+@traced("clean_content")
+def clean_content(html: str, selector: str = "main") -> str:
     tree = HTMLParser(html)
     for tag in tree.css(
         "script, style, link, noscript, object, img, embed, iframe, svg, canvas, form, audio, video"
     ):
         tag.decompose()
-    text = "".join(node.text(deep=True) for node in tree.css("main"))
+    text = "".join(node.text(deep=True) for node in tree.css(selector))
     lines = (line.strip() for line in text.splitlines())
     chunks = (phrase.strip() for line in lines for phrase in line.split(" "))
     cleaned_text = " ".join(chunk for chunk in chunks if chunk)
@@ -47,14 +30,37 @@ def clean_content(html: str) -> str:
     return cleaned_text
 
 
+def get_entry_published(entry) -> datetime | None:
+    published = entry.get("published_parsed") or entry.get("updated_parsed")
+    if not published:
+        return None
+
+    return datetime(*published[:6])
+
+
+async def get_new_entries(
+    session: AsyncSession, feed: Feed, d, max: int | None
+) -> list[tuple[str, datetime | None]]:
+    statement = select(Post.url).where(Post.feed_id == feed.id)
+    results = await session.execute(statement)
+    posts_db_urls = set(results.scalars())
+
+    entries = d.entries[:max] if max else d.entries
+    return [
+        (entry.link, get_entry_published(entry))
+        for entry in entries
+        if entry.get("link") and entry.link not in posts_db_urls
+    ]
+
+
 async def get_posts_from_feed(
     session: AsyncSession,
-    client: aiohttp.ClientSession,
+    client: HttpClient,
     feed: Feed,
     max: int | None,
-) -> list[str]:
+) -> list[tuple[str, datetime | None]]:
     try:
-        resp_text = await fetch_content(client, feed.url)
+        resp_text = await client.fetch_text(feed.url)
         if not resp_text:
             console.log(
                 f"[bold red]ERROR[/bold red]: Failed to get posts from '{feed.url}'"
@@ -62,21 +68,7 @@ async def get_posts_from_feed(
             return []
 
         d = feedparser.parse(resp_text)
-        statement = select(Post).where(Post.feed_id == feed.id)
-        results = await session.execute(statement)
-        results = results.scalars()
-        posts_db_urls = {post.url for post in results}
-
-        if max:
-            return [
-                entry.link
-                for entry in d.entries[:max]
-                if entry.link not in posts_db_urls
-            ]
-        else:
-            return [
-                entry.link for entry in d.entries if entry.link not in posts_db_urls
-            ]
+        return await get_new_entries(session, feed, d, max)
     except Exception as e:
         console.log(f"[red bold]ERROR[/red bold]: Parsing feed '{feed.url}': {e}")
         return []
@@ -84,52 +76,65 @@ async def get_posts_from_feed(
 
 async def process_post(
     session: AsyncSession,
-    client: aiohttp.ClientSession,
+    client: HttpClient,
+    analyzer: Analyzer,
+    content_codec: ContentCodec,
     feed: Feed | None,
     url: str,
-) -> None:
-    try:
-        resp_text = await fetch_content(client, url)
-        if not resp_text:
-            return None
-    except Exception as e:
-        console.log(
-            f"[red bold]ERROR[/red bold]: Failed to extract content from '{url}': {e}"
-        )
+    published: datetime | None = None,
+) -> Counter | None:
+    resp_text = await client.fetch_text(url)
+    if not resp_text:
         return None
 
     try:
         cleaned_content = clean_content(resp_text)
         if not cleaned_content:
-            return
+            return None
     except Exception as e:
         console.log(
             f"[red bold]ERROR[/red bold]: Failed to clean content from '{url}': {e}"
         )
         return None
 
+    _, words = add_post(
+        session, analyzer, content_codec, url, cleaned_content, feed, published
+    )
+    return words
+
+
+def add_post(
+    session: AsyncSession,
+    analyzer: Analyzer,
+    content_codec: ContentCodec,
+    url: str,
+    content: str,
+    feed: Feed | None = None,
+    published: datetime | None = None,
+) -> tuple[Post, Counter]:
+    host = extract_domain(url)
     post = Post(
         url=url,
-        domain=tldextract.extract(url).domain,
-        content=cleaned_content,
+        domain=host.domain,
+        host=host.host,
+        registered_domain=host.registered_domain,
         feed=feed,
-        length=len(cleaned_content),
+        length=len(content),
+        published=published,
     )
     session.add(post)
+    session.add(PostContent(post=post, **content_codec.encode(content)))
 
-    words = Counter(normalize_text(post.content).split(" "))
+    words = Counter(analyzer(content))
     occurrences = [
-        Occurrence(word=word, count=count, post=post)
-        for word, count in words.items()
-        if len(word) > 2
+        Occurrence(word=word, count=count, post=post) for word, count in words.items()
     ]
     session.add_all(occurrences)
+    return post, words
 
 
-async def save_feed(
-    session: AsyncSession, client: aiohttp.ClientSession, url: str
-) -> None:
-    resp_text = await fetch_content(client, url)
+async def save_feed(session: AsyncSession, client: HttpClient, url: str) -> None:
+    resp_text = await client.fetch_text(url)
     if not resp_text:
         console.log(
             f"[bold red]ERROR[/bold red]: URL '{url}' doesn't seem to be a valid RSS feed"
@@ -152,10 +157,10 @@ async def save_feed(
 
 async def add_new_feeds(
     session: AsyncSession,
-    client: aiohttp.ClientSession,
+    client: HttpClient,
     urls: list[str],
 ) -> None:
-    with console.status("Processing feeds...", spinner="earth"):
+    with shared_status("Processing feeds..."):
         tasks = []
         for url in urls:
             url = url.strip()
@@ -179,7 +184,12 @@ async def add_new_feeds(
     console.log("[green bold]SUCCESS[/green bold]: Feeds processed")
 
 
-async def crawl_links(session: AsyncSession, urls: list[str]):
+async def crawl_links(
+    session: AsyncSession,
+    urls: list[str],
+    client: HttpClient | None = None,
+    request_interval: float = REQUEST_INTERVAL,
+):
     if len(urls) == 0:
         console.log("[red bold]ERROR[/red bold]: No URLs received")
         return
@@ -192,23 +202,44 @@ async def crawl_links(session: AsyncSession, urls: list[str]):
         if not post:
             post_urls.append(url)
 
-    async with aiohttp.ClientSession(headers=headers) as client:
-        with console.status("Fetching posts...", spinner="earth") as status:
-            tasks = [process_post(session, client, None, url) for url in post_urls]
+    analyzer = await load_analyzer(session)
+    content_codec = await load_content_codec(session)
+    owns_client = client is None
+    context = (
+        nullcontext(client) if client else HttpClient(request_interval=request_interval)
+    )
+    async with context as client:
+        with shared_status("Fetching posts...") as status:
+            tasks = [
+                process_post(session, client, analyzer, content_codec, None, url)
+                for url in post_urls
+            ]
 
             status.update("Fetching posts...")
             await asyncio.gather(*tasks)
 
         await session.commit()
         console.log("[green bold]SUCCESS[/green bold]: Posts fetched")
+        if owns_client:
+            client.report.log()
 
 
 async def crawl_from_feeds(
     session: AsyncSession,
     urls: list[str],
     max: int | None = None,
+    client: HttpClient | None = None,
+    request_interval: float = REQUEST_INTERVAL,
 ):
-    async with aiohttp.ClientSession(headers=headers) as client:
+    analyzer = await load_analyzer(session)
+    content_codec = await load_content_codec(session)
+    # A client passed in is shared with other crawls, so its owner reports
+    # the failures.
+    owns_client = client is None
+    context = (
+        nullcontext(client) if client else HttpClient(request_interval=request_interval)
+    )
+    async with context as client:
         if len(urls) > 0:
             await add_new_feeds(session, client, urls)
 
@@ -218,13 +249,18 @@ async def crawl_from_feeds(
             console.log("[red]ERROR[/red]: No feeds found!")
             return
 
-        with console.status("Fetching posts...", spinner="earth") as status:
+        with shared_status("Fetching posts...") as status:
             for idx, feed in enumerate(feeds):
                 posts = await get_posts_from_feed(session, client, feed, max)
                 if not posts:
                     continue
 
-                tasks = [process_post(session, client, feed, post) for post in posts]
+                tasks = [
+                    process_post(
+                        session, client, analyzer, content_codec, feed, url, published
+                    )
+                    for url, published in posts
+                ]
 
                 status.update(
                     f"[bold][{idx + 1}/{len(feeds)}][/bold] Fetching posts from '{feed.url}'"
@@ -233,3 +269,5 @@ async def crawl_from_feeds(
 
         await session.commit()
         console.log("[green bold]SUCCESS[/green bold]: Posts fetched")
+        if owns_client:
+            client.report.log()
@@ -0,0 +1,245 @@
+import asyncio
+import heapq
+import statistics
+from collections import Counter
+from contextlib import nullcontext
+from datetime import datetime, timedelta, timezone
+import feedparser
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from winzig.analysis import load_analyzer
+from winzig.compression import load_content_codec
+from winzig.crawler import get_entry_published, get_new_entries, process_post
+from winzig.http import HttpClient
+from winzig.models import Feed, Post
+from winzig.tf_idf import update_tf_idfs
+from winzig.console import console
+
+MIN_INTERVAL = 15 * 60
+MAX_INTERVAL = 7 * 24 * 60 * 60
+DEFAULT_INTERVAL = 60 * 60
+# Weight of the latest observation in the moving average of each interval.
+SMOOTHING = 0.3
+# Growth of the interval after a fetch without new posts.
+BACKOFF = 1.5
+# New feeds added with 'winzig crawl' are picked up this often.
+RELOAD_INTERVAL = 5 * 60
+
+UPDATE_PERIODS = {
+    "hourly": 60 * 60,
+    "daily": 24 * 60 * 60,
+    "weekly": 7 * 24 * 60 * 60,
+    "monthly": 30 * 24 * 60 * 60,
+    "yearly": 365 * 24 * 60 * 60,
+}
+
+
+def utcnow() -> datetime:
+    # Dates are stored as naive UTC, like the published dates from feeds.
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def clamp_interval(interval: float) -> float:
+    return min(MAX_INTERVAL, max(MIN_INTERVAL, interval))
+
+
+def get_feed_hint(d) -> float | None:
+    # Shortest interval the feed asks to be fetched at, from the RSS <ttl>
+    # (in minutes) or the syndication module update period.
+    ttl = d.feed.get("ttl")
+    if ttl and str(ttl).strip().isdigit():
+        return int(ttl) * 60
+
+    period = UPDATE_PERIODS.get(str(d.feed.get("sy_updateperiod", "")).strip())
+    if period:
+        try:
+            frequency = int(d.feed.get("sy_updatefrequency", 1))
+        except ValueError:
+            frequency = 1
+
+        return period / max(frequency, 1)
+
+    return None
+
+
+def estimate_interval(d) -> float:
+    # A feed seen for the first time has no history, so its interval is
+    # estimated from the median gap between its entries.
+    dates = sorted(
+        published
+        for published in (get_entry_published(entry) for entry in d.entries)
+        if published
+    )
+    gaps = [
+        (later - earlier).total_seconds()
+        for earlier, later in zip(dates, dates[1:])
+        if later > earlier
+    ]
+    if not gaps:
+        return DEFAULT_INTERVAL
+
+    return statistics.median(gaps)
+
+
+def next_interval(
+    interval: float, elapsed: float, new_posts: int, hint: float | None
+) -> float:
+    # The target is about one new post per fetch. With new posts the observed
+    # rate gives the estimate, without them the interval backs off.
+    if new_posts:
+        estimate = elapsed / new_posts
+    else:
+        estimate = interval * BACKOFF
+
+    interval += SMOOTHING * (estimate - interval)
+    if hint:
+        interval = max(interval, hint)
+
+    return clamp_interval(interval)
+
+
+def schedule_feed(feed: Feed, d, now: datetime, new_posts: int) -> None:
+    hint = get_feed_hint(d) if d is not None else None
+    if feed.refresh_interval is None:
+        interval = estimate_interval(d) if d is not None else DEFAULT_INTERVAL
+        interval = clamp_interval(max(interval, hint or 0))
+    else:
+        elapsed = (now - feed.last_fetched).total_seconds() if feed.last_fetched else 0
+        interval = next_interval(
+            feed.refresh_interval, elapsed or feed.refresh_interval, new_posts, hint
+        )
+
+    feed.refresh_interval = interval
+    feed.last_fetched = now
+    feed.next_fetch = now + timedelta(seconds=interval)
+
+
+async def count_posts(session: AsyncSession) -> int:
+    results = await session.execute(select(func.count()).select_from(Post))
+    return results.scalar()
+
+
+async def refresh_feeds(
+    session: AsyncSession,
+    client: HttpClient,
+    feeds: list[Feed],
+    max: int | None = None,
+) -> int:
+    analyzer = await load_analyzer(session)
+    content_codec = await load_content_codec(session)
+    previous_total = await count_posts(session)
+
+    # Feeds are fetched concurrently, but the session can only run one
+    # statement at a time, so they're processed one after the other.
+    responses = await asyncio.gather(*(client.fetch_text(feed.url) for feed in feeds))
+    words = Counter()
+    new_posts = 0
+    for feed, resp_text in zip(feeds, responses):
+        now = utcnow()
+        if not resp_text:
+            schedule_feed(feed, None, now, 0)
+            continue
+
+        # A malformed feed is retried later with backoff instead of stopping
+        # the daemon, and the daemons of the other shards with it.
+        try:
+            d = feedparser.parse(resp_text)
+            entries = await get_new_entries(session, feed, d, max)
+        except Exception as e:
+            console.log(f"[red bold]ERROR[/red bold]: Parsing feed '{feed.url}': {e}")
+            schedule_feed(feed, None, now, 0)
+            continue
+
+        results = await asyncio.gather(
+            *(
+                process_post(
+                    session, client, analyzer, content_codec, feed, url, published
+                )
+                for url, published in entries
+            )
+        )
+        for post_words in results:
+            if post_words:
+                words.update(post_words)
+                new_posts += 1
+
+        schedule_feed(feed, d, now, len(entries))
+
+    await session.flush()
+    await update_tf_idfs(session, words, previous_total, await count_posts(session))
+    await session.commit()
+    return new_posts
+
+
+async def load_feeds(session: AsyncSession, feed_ids: list[int]) -> list[Feed]:
+    # Feeds stay in the session between refreshes, so they're read again in
+    # case another process changed or deleted them meanwhile.
+    statement = (
+        select(Feed)
+        .where(Feed.id.in_(feed_ids))
+        .execution_options(populate_existing=True)
+    )
+    results = await session.execute(statement)
+    return list(results.scalars())
+
+
+def seconds_until(wake_up: datetime, now: datetime) -> float:
+    return max(0.0, (wake_up - now).total_seconds())
+
+
+async def run_daemon(
+    engine: AsyncEngine,
+    concurrency: int = 8,
+    max: int | None = None,
+    once: bool = False,
+    client: HttpClient | None = None,
+) -> None:
+    # Feeds stay loaded between refreshes, so they aren't expired on commit.
+    session = AsyncSession(engine, expire_on_commit=False)
+    owns_client = client is None
+    async with session, nullcontext(client) if client else HttpClient() as client:
+        queue = []
+        scheduled = set()
+        next_reload = None
+
+        while True:
+            now = utcnow()
+            if next_reload is None or now >= next_reload:
+                results = await session.execute(
+                    select(Feed.id, Feed.next_fetch).where(Feed.id.not_in(scheduled))
+                )
+                for feed_id, next_fetch in results:
+                    heapq.heappush(queue, (next_fetch or now, feed_id))
+                    scheduled.add(feed_id)
+
+                next_reload = now + timedelta(seconds=RELOAD_INTERVAL)
+
+            due = []
+            while queue and queue[0][0] <= now and len(due) < concurrency:
+                due.append(heapq.heappop(queue)[1])
+
+            if not due:
+                if once:
+                    break
+
+                wake_up = min(queue[0][0], next_reload) if queue else next_reload
+                await asyncio.sleep(seconds_until(wake_up, now))
+                continue
+
+            # Feeds deleted since they were scheduled, e.g. by
+            # 'winzig crawl feeds --prune', are dropped instead of refreshed.
+            feeds = await load_feeds(session, due)
+            scheduled.difference_update(set(due) - {feed.id for feed in feeds})
+            if not feeds:
+                continue
+
+            new_posts = await refresh_feeds(session, client, feeds, max)
+            for feed in feeds:
+                heapq.heappush(queue, (feed.next_fetch, feed.id))
+
+            console.log(
+                f"[green bold]SUCCESS[/green bold]: {len(feeds)} feeds refreshed, {new_posts} new posts indexed"
+            )
+
+        if owns_client:
+            client.report.log()
@@ -1,5 +1,9 @@
+from sqlalchemy import insert, inspect, text
 from sqlalchemy.ext.asyncio import AsyncEngine, create_async_engine
-from winzig.models import Base
+from winzig.compression import load_content_codec_sync, measure_storage
+from winzig.domains import extract_domain
+from winzig.models import Base, PostContent
+from winzig.console import console
 
 
 def get_engine(sqlite_url: str) -> AsyncEngine:
@@ -14,6 +18,102 @@ def get_engine(sqlite_url: str) -> AsyncEngine:
     return engine
 
 
+def move_post_contents(conn) -> None:
+    # Post content used to be stored in posts.content, so every scan of the
+    # posts table had to read it.
+    codec = load_content_codec_sync(conn)
+    size_before, scan_before = measure_storage(conn)
+
+    total = 0
+    last_id = 0
+    with console.status(
+        "Moving post content to compressed storage...", spinner="earth"
+    ):
+        while True:
+            rows = conn.exec_driver_sql(
+                "SELECT id, content FROM posts WHERE id > ? ORDER BY id LIMIT 500",
+                (last_id,),
+            ).all()
+            if not rows:
+                break
+
+            conn.execute(
+                insert(PostContent),
+                [
+                    {"post_id": post_id, **codec.encode(content)}
+                    for post_id, content in rows
+                ],
+            )
+            last_id = rows[-1][0]
+            total += len(rows)
+
+        conn.exec_driver_sql("ALTER TABLE posts DROP COLUMN content")
+
+    size_after, scan_after = measure_storage(conn)
+    console.log(
+        f"[green bold]SUCCESS[/green bold]: Content of {total} posts moved to '{codec.codec}' storage. "
+        f"Used space: {size_before / 1e6:.1f} MB -> {size_after / 1e6:.1f} MB, "
+        f"posts metadata scan: {scan_before * 1e3:.1f} ms -> {scan_after * 1e3:.1f} ms. "
+        "Run 'winzig compact' to reclaim the freed space."
+    )
+
+
+def backfill_post_hosts(conn) -> None:
+    rows = conn.exec_driver_sql("SELECT id, url FROM posts").all()
+    if not rows:
+        return
+
+    values = []
+    for post_id, url in rows:
+        host = extract_domain(url)
+        values.append(
+            {
+                "id": post_id,
+                "host": host.host,
+                "registered_domain": host.registered_domain,
+            }
+        )
+
+    conn.execute(
+        text(
+            "UPDATE posts SET host = :host, registered_domain = :registered_domain WHERE id = :id"
+        ),
+        values,
+    )
+    console.log(f"[green bold]SUCCESS[/green bold]: Hosts of {len(rows)} posts saved")
+
+
+def migrate(conn) -> None:
+    # create_all() only creates missing tables, so columns and indexes added
+    # to existing tables in later versions have to be added by hand.
+    inspector = inspect(conn)
+    posts_columns = {column["name"] for column in inspector.get_columns("posts")}
+    if "content" in posts_columns:
+        move_post_contents(conn)
+
+    for table in Base.metadata.sorted_tables:
+        columns = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name in columns:
+                continue
+
+            column_type = column.type.compile(dialect=conn.dialect)
+            conn.execute(
+                text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+            )
+
+        for index in table.indexes:
+            index.create(conn, checkfirst=True)
+
+    # Replaced by the covering index on (word, post_id, count), it would only
+    # slow down writes and take up space.
+    conn.execute(text("DROP INDEX IF EXISTS ix_occurrences_word"))
+
+    if "host" not in posts_columns:
+        backfill_post_hosts(conn)
+
+
 async def create_db_and_tables(engine):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(migrate)
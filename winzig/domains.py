@@ -0,0 +1,43 @@
+from functools import lru_cache
+from typing import NamedTuple
+from urllib.parse import urlsplit
+import tldextract
+
+# Without suffix list URLs and a cache directory only the public suffix list
+# snapshot bundled with tldextract is used, nothing is fetched or written.
+extractor = tldextract.TLDExtract(suffix_list_urls=(), cache_dir=None)
+
+
+class HostInfo(NamedTuple):
+    host: str
+    domain: str
+    registered_domain: str
+
+
+def normalize_host(url: str) -> str:
+    try:
+        host = urlsplit(url.strip()).hostname or ""
+    except ValueError:
+        return ""
+
+    host = host.rstrip(".")
+    if host.startswith("www."):
+        host = host[4:]
+
+    return host
+
+
+@lru_cache(maxsize=10_000)
+def extract_host(host: str) -> HostInfo:
+    result = extractor(host)
+    if result.domain and result.suffix:
+        registered_domain = f"{result.domain}.{result.suffix}"
+    else:
+        # IP addresses and hosts like 'localhost' have no public suffix.
+        registered_domain = host
+
+    return HostInfo(host, result.domain or host, registered_domain)
+
+
+def extract_domain(url: str) -> HostInfo:
+    return extract_host(normalize_host(url))
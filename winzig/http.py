@@ -0,0 +1,222 @@
+import asyncio
+import random
+import socket
+from collections import Counter
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+import aiohttp
+from aiohttp import compression_utils
+from rich.table import Table
+from winzig.domains import extract_domain
+from winzig.profiling import traced
+from winzig.console import console
+
+CONNECTION_LIMIT = 100
+CONNECTION_LIMIT_PER_HOST = 4
+REQUEST_INTERVAL = 0
+KEEPALIVE_TIMEOUT = 30
+DNS_CACHE_TTL = 300
+
+TOTAL_TIMEOUT = 30
+CONNECT_TIMEOUT = 10
+READ_TIMEOUT = 15
+
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 10
+MAX_RETRY_AFTER = 60
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+def accept_encoding() -> str:
+    # aiohttp only decodes brotli and zstd responses when the optional
+    # packages are installed, so they're only advertised then.
+    encodings = ["gzip", "deflate"]
+    if getattr(compression_utils, "HAS_BROTLI", False):
+        encodings.append("br")
+    if getattr(compression_utils, "HAS_ZSTD", False):
+        encodings.append("zstd")
+
+    return ", ".join(encodings)
+
+
+headers = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64; rv:123.0) Gecko/20100101 Firefox/123.0",
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,image/avif,image/webp,image/apng,*/*;q=0.8",
+    "Accept-Encoding": accept_encoding(),
+    "Accept-Language": "en-GB,en;q=0.6",
+}
+
+
+def classify_error(error: Exception) -> str:
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    if isinstance(error, aiohttp.ClientSSLError):
+        return "tls"
+    if isinstance(error, aiohttp.ClientConnectorError):
+        if isinstance(error.os_error, socket.gaierror):
+            return "dns"
+        return "refused"
+    if isinstance(error, aiohttp.ServerDisconnectedError):
+        return "disconnected"
+    if isinstance(error, aiohttp.TooManyRedirects):
+        return "redirects"
+    if isinstance(error, aiohttp.ClientPayloadError):
+        return "payload"
+    if isinstance(error, aiohttp.InvalidURL):
+        return "invalid_url"
+    if isinstance(error, UnicodeDecodeError):
+        return "decoding"
+    return "other"
+
+
+def classify_status(status: int) -> str:
+    if status == 429:
+        return "rate_limited"
+    if status >= 500:
+        return "server_error"
+    return f"http_{status}"
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    # Retry-After is either a number of seconds or an HTTP date.
+    if not value:
+        return None
+
+    if value.strip().isdigit():
+        return float(value)
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, (date - datetime.now(timezone.utc)).total_seconds())
+
+
+def backoff_delay(attempt: int) -> float:
+    # Exponential backoff with full jitter, so requests that failed together
+    # aren't retried together.
+    return random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2**attempt))
+
+
+class CrawlReport:
+    def __init__(self) -> None:
+        self.fetched = 0
+        self.retries = 0
+        self.failures = Counter()
+
+    def record_failure(self, url: str, kind: str, detail: str) -> None:
+        self.failures[kind] += 1
+        console.log(
+            f"[red bold]ERROR[/red bold]: Failed to fetch '{url}' ({kind}): {detail}"
+        )
+
+    def log(self) -> None:
+        if not self.failures:
+            console.log(
+                f"[green bold]SUCCESS[/green bold]: {self.fetched} URLs fetched without errors ({self.retries} retries)"
+            )
+            return
+
+        table = Table(title="Failed requests")
+        table.add_column("Reason")
+        table.add_column("Count", justify="right")
+        for kind, count in self.failures.most_common():
+            table.add_row(kind, str(count))
+
+        console.print(table)
+        console.log(
+            f"[yellow bold]WARNING[/yellow bold]: {self.fetched} URLs fetched, {self.failures.total()} failed ({self.retries} retries)"
+        )
+
+
+class HttpClient:
+    def __init__(
+        self,
+        limit_per_host: int = CONNECTION_LIMIT_PER_HOST,
+        request_interval: float = REQUEST_INTERVAL,
+    ) -> None:
+        self.limit_per_host = limit_per_host
+        self.request_interval = request_interval
+        self.report = CrawlReport()
+        self.session = None
+
+        self._host_semaphores = {}
+        self._host_next_request = {}
+
+    async def __aenter__(self) -> "HttpClient":
+        connector = aiohttp.TCPConnector(
+            limit=CONNECTION_LIMIT,
+            limit_per_host=self.limit_per_host,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=DNS_CACHE_TTL,
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=TOTAL_TIMEOUT, sock_connect=CONNECT_TIMEOUT, sock_read=READ_TIMEOUT
+        )
+        self.session = aiohttp.ClientSession(
+            headers=headers, connector=connector, timeout=timeout
+        )
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        await self.session.close()
+
+    @asynccontextmanager
+    async def host_slot(self, url: str):
+        # Politeness is per registrable domain, so subdomains of the same site
+        # share the connection limit, and requests to it can be spaced out.
+        key = extract_domain(url).registered_domain
+        if key not in self._host_semaphores:
+            self._host_semaphores[key] = asyncio.Semaphore(self.limit_per_host)
+
+        async with self._host_semaphores[key]:
+            if self.request_interval:
+                loop = asyncio.get_running_loop()
+                start = max(loop.time(), self._host_next_request.get(key, 0))
+                self._host_next_request[key] = start + self.request_interval
+                await asyncio.sleep(start - loop.time())
+
+            yield
+
+    @traced("fetch")
+    async def fetch_text(self, url: str) -> str | None:
+        # Only responses the server asks to retry and dropped connections are
+        # retried. Timeouts, DNS errors and refused connections aren't, a dead
+        # host would otherwise hold a worker for minutes.
+        for attempt in range(MAX_RETRIES + 1):
+            delay = None
+            try:
+                async with self.host_slot(url), self.session.get(url) as resp:
+                    if resp.status in RETRY_STATUSES and attempt < MAX_RETRIES:
+                        delay = parse_retry_after(resp.headers.get("Retry-After"))
+                        if delay is None:
+                            delay = backoff_delay(attempt)
+                        elif delay > MAX_RETRY_AFTER:
+                            delay = None
+
+                    if delay is None:
+                        if resp.status >= 400:
+                            self.report.record_failure(
+                                url,
+                                classify_status(resp.status),
+                                f"status {resp.status}",
+                            )
+                            return None
+
+                        text = await resp.text()
+                        self.report.fetched += 1
+                        return text
+            except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeDecodeError) as e:
+                kind = classify_error(e)
+                if kind != "disconnected" or attempt == MAX_RETRIES:
+                    self.report.record_failure(url, kind, str(e) or type(e).__name__)
+                    return None
+
+                delay = backoff_delay(attempt)
+
+            # The connection is released before waiting.
+            self.report.retries += 1
+            await asyncio.sleep(delay)
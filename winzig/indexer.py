@@ -0,0 +1,168 @@
+import asyncio
+import multiprocessing
+import os
+import time
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from sqlalchemy import MetaData, delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.analysis import Analyzer, get_analyzer
+from winzig.compression import ContentCodec, load_content_codec
+from winzig.models import Feed, Occurrence, Post, PostContent
+from winzig.settings import set_setting
+from winzig.console import console
+
+SHADOW_TABLE = "occurrences_new"
+
+
+def analyze_posts(
+    analyzer_name: str, posts: list[tuple[int, str]]
+) -> list[tuple[int, str, int]]:
+    analyzer = get_analyzer(analyzer_name)
+    return [
+        (post_id, word, count)
+        for post_id, content in posts
+        for word, count in Counter(analyzer(content)).items()
+    ]
+
+
+def create_shadow_table(conn) -> None:
+    metadata = MetaData()
+    Post.__table__.to_metadata(metadata)
+    shadow = Occurrence.__table__.to_metadata(metadata, name=SHADOW_TABLE)
+
+    # Indexes are built once after the bulk load, which is much faster than
+    # keeping them up to date on every insert.
+    shadow.indexes.clear()
+    shadow.drop(conn, checkfirst=True)
+    shadow.create(conn)
+
+
+def create_occurrences_indexes(conn) -> None:
+    for index in Occurrence.__table__.indexes:
+        index.create(conn)
+
+
+async def iter_post_chunks(
+    session: AsyncSession,
+    content_codec: ContentCodec,
+    conditions: list,
+    chunk_size: int,
+):
+    last_id = 0
+    while True:
+        statement = (
+            select(
+                Post.id, PostContent.codec, PostContent.dictionary_id, PostContent.data
+            )
+            .join(PostContent)
+            .where(Post.id > last_id, *conditions)
+            .order_by(Post.id)
+            .limit(chunk_size)
+        )
+        results = await session.execute(statement)
+        chunk = [
+            (post_id, content_codec.decode(codec, dictionary_id, data))
+            for post_id, codec, dictionary_id, data in results
+        ]
+        if not chunk:
+            return
+
+        last_id = chunk[-1][0]
+        yield chunk
+
+
+async def reindex_posts(
+    session: AsyncSession,
+    analyzer: Analyzer,
+    feeds: list[str] | None = None,
+    since: datetime | None = None,
+    workers: int | None = None,
+    chunk_size: int = 500,
+) -> None:
+    conditions = []
+    if feeds:
+        feed_ids = select(Feed.id).where(Feed.url.in_(feeds))
+        conditions.append(Post.feed_id.in_(feed_ids))
+    if since:
+        conditions.append(Post.published >= since)
+
+    # A full reindex is written to a shadow table and committed in batches, so
+    # searches keep using the old postings until the tables are swapped. A
+    # partial reindex replaces the postings of the selected posts in a single
+    # transaction instead.
+    partial = bool(conditions)
+    if partial:
+        target = Occurrence.__tablename__
+        posts = select(Post.id).where(*conditions)
+        await session.execute(delete(Occurrence).where(Occurrence.post_id.in_(posts)))
+    else:
+        target = SHADOW_TABLE
+        conn = await session.connection()
+        await conn.run_sync(create_shadow_table)
+
+    insert_statement = f"INSERT INTO {target} (post_id, word, count) VALUES (?, ?, ?)"
+
+    content_codec = await load_content_codec(session)
+    workers = workers or os.cpu_count() or 1
+    loop = asyncio.get_running_loop()
+    start = time.perf_counter()
+    total = 0
+
+    async def write(job) -> None:
+        nonlocal total
+        posts_count, future = job
+        rows = await future
+        if rows:
+            conn = await session.connection()
+            await conn.exec_driver_sql(insert_statement, rows)
+        if not partial:
+            await session.commit()
+
+        total += posts_count
+
+    with console.status("Reindexing posts...", spinner="earth") as status:
+        # Workers are spawned rather than forked, forking a process that is
+        # running an event loop and the aiosqlite thread isn't safe.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=workers, mp_context=context) as executor:
+            pending = deque()
+            async for chunk in iter_post_chunks(
+                session, content_codec, conditions, chunk_size
+            ):
+                future = loop.run_in_executor(
+                    executor, analyze_posts, analyzer.name, chunk
+                )
+                pending.append((len(chunk), future))
+
+                if len(pending) >= workers * 2:
+                    await write(pending.popleft())
+
+                    elapsed = time.perf_counter() - start
+                    status.update(
+                        f"Reindexing posts... [bold]{total}[/bold] done ({total / elapsed:.0f} posts/s)"
+                    )
+
+            while pending:
+                await write(pending.popleft())
+
+        status.update("Saving postings...")
+        if not partial:
+            # pysqlite doesn't open transactions for DDL statements on its own,
+            # so the swap is wrapped explicitly to make it atomic.
+            conn = await session.connection()
+            await conn.exec_driver_sql("BEGIN")
+            await conn.exec_driver_sql(f"DROP TABLE {Occurrence.__tablename__}")
+            await conn.exec_driver_sql(
+                f"ALTER TABLE {SHADOW_TABLE} RENAME TO {Occurrence.__tablename__}"
+            )
+            await conn.run_sync(create_occurrences_indexes)
+
+        await set_setting(session, "analyzer", analyzer.name)
+        await session.commit()
+
+    elapsed = time.perf_counter() - start
+    console.log(
+        f"[green bold]SUCCESS[/green bold]: {total} posts reindexed with the '{analyzer.name}' analyzer in {elapsed:.2f}s ({total / elapsed:.0f} posts/s)"
+    )
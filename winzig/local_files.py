@@ -0,0 +1,252 @@
+import asyncio
+import hashlib
+import os
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from itertools import batched
+from pathlib import Path
+from sqlalchemy import delete, func, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from winzig.analysis import load_analyzer
+from winzig.compression import load_content_codec
+from winzig.crawler import add_post, clean_content
+from winzig.models import LocalFile, Occurrence, Post, PostContent
+from winzig.sharding import shard_index
+from winzig.tf_idf import update_tf_idfs
+from winzig.console import console
+
+TEXT_EXTENSIONS = (".md", ".markdown", ".txt", ".rst", ".org")
+HTML_EXTENSIONS = (".html", ".htm")
+READ_CONCURRENCY = 16
+BATCH_SIZE = 500
+WATCH_INTERVAL = 2.0
+
+
+def is_supported(name: str) -> bool:
+    return not name.startswith(".") and name.lower().endswith(
+        TEXT_EXTENSIONS + HTML_EXTENSIONS
+    )
+
+
+def scan_files(roots: list[Path]) -> dict[str, tuple[int, int]]:
+    # Only the modification time and size of every file are read here, which
+    # is all that's needed to skip the files that didn't change.
+    files = {}
+    for root in roots:
+        if root.is_file():
+            paths = [str(root)]
+        else:
+            paths = []
+            for dirpath, dirnames, filenames in os.walk(root):
+                dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+                paths.extend(
+                    os.path.join(dirpath, name)
+                    for name in filenames
+                    if is_supported(name)
+                )
+
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+
+            files[path] = (stat.st_mtime_ns, stat.st_size)
+
+    return files
+
+
+def read_file(path: str) -> tuple[str, str] | None:
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except OSError:
+        return None
+
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    text = data.decode("utf-8", errors="replace")
+    if path.lower().endswith(HTML_EXTENSIONS):
+        return digest, clean_content(text, selector="body")
+
+    return digest, " ".join(text.split())
+
+
+def is_under(path: str, roots: list[Path]) -> bool:
+    return any(
+        path == str(root) or path.startswith(str(root) + os.sep) for root in roots
+    )
+
+
+async def remove_posts(session: AsyncSession, post_ids: list[int]) -> Counter:
+    words = Counter()
+    for chunk in batched(post_ids, 500):
+        statement = select(Occurrence.word, Occurrence.count).where(
+            Occurrence.post_id.in_(chunk)
+        )
+        results = await session.execute(statement)
+        for word, count in results:
+            words[word] -= count
+
+        await session.execute(delete(Occurrence).where(Occurrence.post_id.in_(chunk)))
+        await session.execute(delete(PostContent).where(PostContent.post_id.in_(chunk)))
+        await session.execute(delete(Post).where(Post.id.in_(chunk)))
+
+    return words
+
+
+async def index_files(
+    session: AsyncSession, roots: list[Path], files: dict[str, tuple[int, int]]
+) -> Counter:
+    statement = select(
+        LocalFile.path,
+        LocalFile.id,
+        LocalFile.mtime_ns,
+        LocalFile.size,
+        LocalFile.hash,
+        LocalFile.post_id,
+    ).where(or_(*(LocalFile.path.startswith(str(root)) for root in roots)))
+    results = await session.execute(statement)
+    known = {row[0]: row[1:] for row in results if is_under(row[0], roots)}
+
+    changes = Counter()
+    removed = [path for path in known if path not in files]
+    candidates = [
+        path
+        for path, (mtime_ns, size) in files.items()
+        if path not in known or known[path][1:3] != (mtime_ns, size)
+    ]
+    if not removed and not candidates:
+        return changes
+
+    analyzer = await load_analyzer(session)
+    content_codec = await load_content_codec(session)
+    result = await session.execute(select(func.count()).select_from(Post))
+    previous_total = result.scalar()
+
+    words = await remove_posts(
+        session, [known[path][4] for path in removed if known[path][4] is not None]
+    )
+    await session.execute(
+        delete(LocalFile).where(LocalFile.id.in_([known[path][0] for path in removed]))
+    )
+    changes["removed"] = len(removed)
+
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(READ_CONCURRENCY) as executor:
+        for chunk in batched(candidates, BATCH_SIZE):
+            contents = await asyncio.gather(
+                *(loop.run_in_executor(executor, read_file, path) for path in chunk)
+            )
+            loaded = [
+                (path, *content)
+                for path, content in zip(chunk, contents)
+                if content is not None
+            ]
+
+            # Files whose content didn't change, e.g. after a checkout, only
+            # get their modification time updated.
+            touched = [
+                {
+                    "id": known[path][0],
+                    "mtime_ns": files[path][0],
+                    "size": files[path][1],
+                }
+                for path, digest, _ in loaded
+                if path in known and known[path][3] == digest
+            ]
+            if touched:
+                await session.execute(update(LocalFile), touched)
+
+            changed = [
+                (path, digest, text)
+                for path, digest, text in loaded
+                if path not in known or known[path][3] != digest
+            ]
+            replaced = [path for path, _, _ in changed if path in known]
+            if replaced:
+                words.update(
+                    await remove_posts(
+                        session,
+                        [
+                            known[path][4]
+                            for path in replaced
+                            if known[path][4] is not None
+                        ],
+                    )
+                )
+                await session.execute(
+                    delete(LocalFile).where(
+                        LocalFile.id.in_([known[path][0] for path in replaced])
+                    )
+                )
+
+            for path, digest, text in changed:
+                mtime_ns, size = files[path]
+                post = None
+                if text:
+                    published = datetime.fromtimestamp(mtime_ns / 1e9, timezone.utc)
+                    post, post_words = add_post(
+                        session,
+                        analyzer,
+                        content_codec,
+                        Path(path).as_uri(),
+                        text,
+                        published=published.replace(tzinfo=None),
+                    )
+                    words.update(post_words)
+
+                session.add(
+                    LocalFile(
+                        path=path, mtime_ns=mtime_ns, size=size, hash=digest, post=post
+                    )
+                )
+
+            changes["updated"] += len(replaced)
+            changes["added"] += len(changed) - len(replaced)
+            await session.flush()
+
+    result = await session.execute(select(func.count()).select_from(Post))
+    await update_tf_idfs(session, words, previous_total, result.scalar())
+    await session.commit()
+    return changes
+
+
+async def index_paths(
+    engines: list[AsyncEngine], roots: list[Path], quiet: bool = False
+) -> Counter:
+    files = await asyncio.to_thread(scan_files, roots)
+
+    # Files are routed like posts without a feed when the index is split.
+    groups = [{} for _ in engines]
+    for path, stat in files.items():
+        idx = shard_index(Path(path).as_uri(), len(engines)) if len(engines) > 1 else 0
+        groups[idx][path] = stat
+
+    changes = Counter()
+    for engine, group in zip(engines, groups):
+        async with AsyncSession(engine) as session:
+            changes.update(await index_files(session, roots, group))
+
+    if changes:
+        console.log(
+            f"[green bold]SUCCESS[/green bold]: {changes['added']} files added, {changes['updated']} updated and {changes['removed']} removed"
+        )
+    elif not quiet:
+        console.log(
+            f"[green bold]SUCCESS[/green bold]: {len(files)} files already up to date"
+        )
+
+    return changes
+
+
+async def watch_paths(
+    engines: list[AsyncEngine], roots: list[Path], interval: float = WATCH_INTERVAL
+) -> None:
+    # Polling works the same on every platform and filesystem, and a scan of
+    # files that didn't change only costs a stat() per file.
+    await index_paths(engines, roots)
+    console.log(f"Watching {len(roots)} paths for changes every {interval:g}s...")
+    while True:
+        await asyncio.sleep(interval)
+        await index_paths(engines, roots, quiet=True)
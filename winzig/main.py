@@ -1,13 +1,39 @@
 import asyncio
+import cProfile
 import click
+from winzig import profiling
 from winzig.config import Config
 from winzig.database import create_db_and_tables, get_engine
-from winzig.commands import crawl, search, start_tui, export
+from winzig.sharding import get_shard_engines
+from winzig.commands import (
+    crawl,
+    search,
+    start_tui,
+    export,
+    reindex,
+    compact,
+    bench,
+    daemon,
+    shards,
+    index,
+)
 
 
 @click.group()
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Print a breakdown of where the time went, with the number of SQL statements run.",
+)
+@click.option(
+    "--profile-output",
+    type=click.Path(),
+    default=None,
+    help="Also save the profile to this file: a cProfile dump if it ends in '.prof', a JSON trace otherwise. Implies --profile.",
+)
 @click.pass_context
-def cli(ctx):
+def cli(ctx, profile: bool, profile_output: str | None):
     if ctx.obj is None:
         ctx.obj = {}
 
@@ -15,11 +41,42 @@ def cli(ctx):
     asyncio.run(create_db_and_tables(engine))
     ctx.obj["engine"] = engine
 
+    ctx.obj["shards"] = get_shard_engines(Config().shards_dir)
+    for shard in ctx.obj["shards"]:
+        asyncio.run(create_db_and_tables(shard))
+
+    if profile or profile_output:
+        start_profiling(ctx, [engine, *ctx.obj["shards"]], profile_output)
+
+
+def start_profiling(ctx, engines, output: str | None) -> None:
+    profiler = profiling.enable(*engines)
+    python_profiler = None
+    if output and output.endswith(".prof"):
+        python_profiler = cProfile.Profile()
+        python_profiler.enable()
+
+    def stop_profiling() -> None:
+        profiler.print_report()
+        if python_profiler:
+            python_profiler.disable()
+            python_profiler.dump_stats(output)
+        elif output:
+            profiler.save_trace(output)
+
+    ctx.call_on_close(stop_profiling)
+
 
 cli.add_command(crawl)
 cli.add_command(search)
 cli.add_command(start_tui)
 cli.add_command(export)
+cli.add_command(reindex)
+cli.add_command(compact)
+cli.add_command(bench)
+cli.add_command(daemon)
+cli.add_command(shards)
+cli.add_command(index)
 
 if __name__ == "__main__":
     cli()
@@ -1,9 +1,15 @@
 import csv
-from sqlalchemy import delete, select
-from sqlalchemy.ext.asyncio import AsyncSession
-from winzig.models import Feed, Post
+from rich.table import Table
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from winzig.compression import load_content_codec, measure_storage, train_dictionary
+from winzig.models import CompressionDictionary, Feed, Post, PostContent, Setting
+from winzig.settings import set_setting
 from winzig.console import console
 
+DICTIONARY_SAMPLES = 2_000
+DICTIONARY_SAMPLE_LENGTH = 100_000
+
 
 async def remove_empty_feeds(session: AsyncSession) -> None:
     try:
@@ -22,11 +28,19 @@ async def remove_empty_feeds(session: AsyncSession) -> None:
         console.log(f"[red bold]ERROR[/red bold]: Failed to remove empty feeds: {e}")
 
 
-async def export_feeds_to_txt(session: AsyncSession, output: str) -> None:
+async def select_all(sessions: list[AsyncSession], statement) -> list:
+    rows = []
+    for session in sessions:
+        results = await session.execute(statement)
+        rows.extend(results.scalars())
+
+    return rows
+
+
+async def export_feeds_to_txt(sessions: list[AsyncSession], output: str) -> None:
     try:
         with console.status("Exporting feeds to plain text...", spinner="earth"):
-            results = await session.execute(select(Feed))
-            feeds = results.scalars().all()
+            feeds = await select_all(sessions, select(Feed))
 
             with open(output, "w", encoding="utf-8") as f:
                 for feed in feeds:
@@ -37,11 +51,10 @@ async def export_feeds_to_txt(session: AsyncSession, output: str) -> None:
         console.log(f"[red bold]ERROR[/red bold]: Failed to export feeds: {e}")
 
 
-async def export_feeds_to_csv(session: AsyncSession, output: str) -> None:
+async def export_feeds_to_csv(sessions: list[AsyncSession], output: str) -> None:
     try:
         with console.status("Exporting feeds to CSV...", spinner="earth"):
-            results = await session.execute(select(Feed))
-            feeds = results.scalars().all()
+            feeds = await select_all(sessions, select(Feed))
 
             with open(output, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
@@ -63,11 +76,10 @@ def get_feeds_from_csv(file) -> list[str]:
         return feeds
 
 
-async def export_posts_to_txt(session: AsyncSession, output: str) -> None:
+async def export_posts_to_txt(sessions: list[AsyncSession], output: str) -> None:
     try:
         with console.status("Exporting posts to plain text...", spinner="earth"):
-            results = await session.execute(select(Post))
-            posts = results.scalars().all()
+            posts = await select_all(sessions, select(Post))
 
             with open(output, "w", encoding="utf-8") as f:
                 for post in posts:
@@ -78,11 +90,10 @@ async def export_posts_to_txt(session: AsyncSession, output: str) -> None:
         console.log(f"[red bold]ERROR[/red bold]: Failed to export posts: {e}")
 
 
-async def export_posts_to_csv(session: AsyncSession, output: str) -> None:
+async def export_posts_to_csv(sessions: list[AsyncSession], output: str) -> None:
     try:
         with console.status("Exporting posts to CSV...", spinner="earth"):
-            results = await session.execute(select(Post))
-            posts = results.scalars().all()
+            posts = await select_all(sessions, select(Post))
 
             with open(output, "w", newline="", encoding="utf-8") as f:
                 writer = csv.writer(f)
@@ -102,3 +113,135 @@ def get_posts_from_csv(file) -> list[str]:
 
         posts = [row[1] for row in reader]
         return posts
+
+
+async def train_compression_dictionary(
+    session: AsyncSession, codec: str, size: int
+) -> int:
+    current_codec = await load_content_codec(session)
+    statement = (
+        select(PostContent.codec, PostContent.dictionary_id, PostContent.data)
+        .order_by(func.random())
+        .limit(DICTIONARY_SAMPLES)
+    )
+    results = await session.execute(statement)
+    samples = [
+        current_codec.decode(*row, max_length=DICTIONARY_SAMPLE_LENGTH)
+        for row in results
+    ]
+
+    dictionary = CompressionDictionary(
+        codec=codec, data=train_dictionary(samples, size)
+    )
+    session.add(dictionary)
+    await session.flush()
+    return dictionary.id
+
+
+async def recompress_posts(session: AsyncSession, chunk_size: int = 500) -> int:
+    # The codec has every dictionary loaded, so it can decode content stored
+    # with any of them.
+    content_codec = await load_content_codec(session)
+
+    total = 0
+    last_id = 0
+    while True:
+        statement = (
+            select(
+                PostContent.post_id,
+                PostContent.codec,
+                PostContent.dictionary_id,
+                PostContent.data,
+            )
+            .where(PostContent.post_id > last_id)
+            .order_by(PostContent.post_id)
+            .limit(chunk_size)
+        )
+        results = await session.execute(statement)
+        rows = results.all()
+        if not rows:
+            return total
+
+        values = [
+            {
+                "post_id": post_id,
+                **content_codec.encode(
+                    content_codec.decode(codec, dictionary_id, data)
+                ),
+            }
+            for post_id, codec, dictionary_id, data in rows
+            if codec != content_codec.codec
+            or dictionary_id != content_codec.dictionary_id
+        ]
+        if values:
+            await session.execute(update(PostContent), values)
+            await session.commit()
+
+        last_id = rows[-1][0]
+        total += len(values)
+
+
+async def compact_database(
+    engine: AsyncEngine, codec: str, dictionary_size: int | None = None
+) -> None:
+    async with engine.connect() as conn:
+        size_before, scan_before = await conn.run_sync(measure_storage)
+
+    try:
+        async with AsyncSession(engine) as session:
+            with console.status("Compacting database...", spinner="earth") as status:
+                dictionary_id = None
+                if dictionary_size:
+                    status.update("Training compression dictionary...")
+                    dictionary_id = await train_compression_dictionary(
+                        session, codec, dictionary_size
+                    )
+
+                await set_setting(session, "compression", codec)
+                if dictionary_id:
+                    await set_setting(
+                        session, "compression_dictionary", str(dictionary_id)
+                    )
+                else:
+                    await session.execute(
+                        delete(Setting).where(Setting.key == "compression_dictionary")
+                    )
+                await session.commit()
+
+                status.update("Recompressing posts...")
+                total = await recompress_posts(session)
+
+                used_dictionaries = select(PostContent.dictionary_id).where(
+                    PostContent.dictionary_id.is_not(None)
+                )
+                await session.execute(
+                    delete(CompressionDictionary).where(
+                        CompressionDictionary.id.not_in(used_dictionaries)
+                    )
+                )
+                await session.commit()
+    except Exception as e:
+        console.log(f"[red bold]ERROR[/red bold]: Failed to compact database: {e}")
+        return
+
+    with console.status("Reclaiming free space...", spinner="earth"):
+        # VACUUM can't run inside a transaction.
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.exec_driver_sql("VACUUM")
+            size_after, scan_after = await conn.run_sync(measure_storage)
+
+    table = Table(title="Storage")
+    table.add_column("")
+    table.add_column("Before", justify="right")
+    table.add_column("After", justify="right")
+    table.add_row("Size", f"{size_before / 1e6:.2f} MB", f"{size_after / 1e6:.2f} MB")
+    table.add_row(
+        "Posts metadata scan",
+        f"{scan_before * 1e3:.1f} ms",
+        f"{scan_after * 1e3:.1f} ms",
+    )
+    console.print(table)
+    console.log(
+        f"[green bold]SUCCESS[/green bold]: {total} posts recompressed with the '{codec}' codec"
+    )
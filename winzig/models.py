@@ -1,5 +1,6 @@
+from datetime import datetime
 from typing import List
-from sqlalchemy import ForeignKey
+from sqlalchemy import ForeignKey, Index
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from sqlalchemy.ext.asyncio import AsyncAttrs
 
@@ -15,6 +16,9 @@ class Feed(Base):
     title: Mapped[str] = mapped_column(nullable=True)
     description: Mapped[str] = mapped_column(nullable=True)
     url: Mapped[str] = mapped_column(index=True)
+    refresh_interval: Mapped[float] = mapped_column(nullable=True)
+    last_fetched: Mapped[datetime] = mapped_column(nullable=True)
+    next_fetch: Mapped[datetime] = mapped_column(nullable=True, index=True)
 
     posts: Mapped[List["Post"]] = relationship(back_populates="feed")
 
@@ -23,15 +27,41 @@ class Post(Base):
     __tablename__ = "posts"
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    domain: Mapped[str] = mapped_column(nullable=True)
+    domain: Mapped[str] = mapped_column(nullable=True, index=True)
+    host: Mapped[str] = mapped_column(nullable=True, index=True)
+    registered_domain: Mapped[str] = mapped_column(nullable=True, index=True)
     url: Mapped[str] = mapped_column(index=True)
-    content: Mapped[str]
     length: Mapped[int] = mapped_column(default=0)
+    published: Mapped[datetime] = mapped_column(nullable=True, index=True)
 
-    feed_id: Mapped[int] = mapped_column(ForeignKey("feeds.id"), nullable=True)
+    feed_id: Mapped[int] = mapped_column(
+        ForeignKey("feeds.id"), nullable=True, index=True
+    )
     feed: Mapped[Feed] = relationship(back_populates="posts")
 
     occurrences: Mapped[List["Occurrence"]] = relationship(back_populates="post")
+    body: Mapped["PostContent"] = relationship(back_populates="post")
+
+
+class PostContent(Base):
+    __tablename__ = "post_contents"
+
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id"), primary_key=True)
+    codec: Mapped[str] = mapped_column(default="none")
+    dictionary_id: Mapped[int] = mapped_column(
+        ForeignKey("compression_dictionaries.id"), nullable=True
+    )
+    data: Mapped[bytes]
+
+    post: Mapped[Post] = relationship(back_populates="body")
+
+
+class CompressionDictionary(Base):
+    __tablename__ = "compression_dictionaries"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    codec: Mapped[str]
+    data: Mapped[bytes]
 
 
 class Keyword(Base):
@@ -45,10 +75,35 @@ class Keyword(Base):
 
 class Occurrence(Base):
     __tablename__ = "occurrences"
+    __table_args__ = (
+        Index("ix_occurrences_word_post_id_count", "word", "post_id", "count"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
-    word: Mapped[str] = mapped_column(index=True)
+    word: Mapped[str]
     count: Mapped[int] = mapped_column(default=0)
 
-    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id"))
+    post_id: Mapped[int] = mapped_column(ForeignKey("posts.id"), index=True)
     post: Mapped[Post] = relationship(back_populates="occurrences")
+
+
+class Setting(Base):
+    __tablename__ = "settings"
+
+    key: Mapped[str] = mapped_column(primary_key=True)
+    value: Mapped[str] = mapped_column(nullable=True)
+
+
+class LocalFile(Base):
+    __tablename__ = "local_files"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    path: Mapped[str] = mapped_column(unique=True)
+    mtime_ns: Mapped[int]
+    size: Mapped[int]
+    hash: Mapped[str]
+
+    post_id: Mapped[int] = mapped_column(
+        ForeignKey("posts.id"), nullable=True, index=True
+    )
+    post: Mapped[Post] = relationship()
@@ -0,0 +1,194 @@
+import inspect
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from functools import wraps
+from rich.table import Table
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncEngine
+from sqlalchemy.orm import Session
+from winzig.console import console
+
+# Set while profiling, instrumented code checks it before doing anything else
+# so there's almost no overhead when profiling is off.
+profiler = None
+# Spans open in the current task. Every task gets its own copy, so spans
+# running concurrently, like the searches of each shard, are only charged
+# with the statements run by their own task.
+active_spans: ContextVar[tuple["Span", ...]] = ContextVar("active_spans", default=())
+
+
+class Span:
+    def __init__(self, profiler: "Profiler", name: str) -> None:
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self) -> None:
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.token = active_spans.set((*active_spans.get(), self))
+
+    def __exit__(self, *exc_info) -> None:
+        end = time.perf_counter()
+        active_spans.reset(self.token)
+        self.profiler.record(self.name, self.start, end, self.statements)
+
+
+class NullSpan:
+    def __enter__(self) -> None:
+        pass
+
+    def __exit__(self, *exc_info) -> None:
+        pass
+
+
+NULL_SPAN = NullSpan()
+
+
+class Profiler:
+    def __init__(self) -> None:
+        self.start = time.perf_counter()
+        self.statements = 0
+        self.spans = {}
+        self.events = []
+
+    def record(self, name: str, start: float, end: float, statements: int) -> None:
+        duration = end - start
+        if name not in self.spans:
+            self.spans[name] = {"calls": 0, "seconds": 0.0, "max": 0.0, "sql": 0}
+
+        stats = self.spans[name]
+        stats["calls"] += 1
+        stats["seconds"] += duration
+        stats["max"] = max(stats["max"], duration)
+        stats["sql"] += statements
+        self.events.append((name, start, duration, threading.get_ident()))
+
+    def print_report(self) -> None:
+        elapsed = time.perf_counter() - self.start
+        table = Table(
+            title=f"Profile ({elapsed:.2f}s, {self.statements} SQL statements)"
+        )
+        table.add_column("Span")
+        table.add_column("Calls", justify="right")
+        table.add_column("Total", justify="right")
+        table.add_column("Mean", justify="right")
+        table.add_column("Max", justify="right")
+        table.add_column("SQL", justify="right")
+
+        spans = sorted(self.spans.items(), key=lambda item: -item[1]["seconds"])
+        for name, stats in spans:
+            table.add_row(
+                name,
+                str(stats["calls"]),
+                f"{stats['seconds']:.3f} s",
+                f"{stats['seconds'] / stats['calls'] * 1e3:.2f} ms",
+                f"{stats['max'] * 1e3:.2f} ms",
+                str(stats["sql"]),
+            )
+
+        console.print(table)
+        console.print(
+            "Spans running concurrently, like fetches, add up to more than the elapsed time."
+        )
+
+    def save_trace(self, output: str) -> None:
+        # Trace Event Format, which can be opened in Perfetto or chrome://tracing.
+        trace = {
+            "traceEvents": [
+                {
+                    "name": name,
+                    "ph": "X",
+                    "ts": (start - self.start) * 1e6,
+                    "dur": duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": thread_id,
+                }
+                for name, start, duration, thread_id in self.events
+            ],
+            "spans": self.spans,
+            "statements": self.statements,
+        }
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(trace, f)
+
+
+def span(name: str):
+    if profiler is None:
+        return NULL_SPAN
+
+    return Span(profiler, name)
+
+
+def traced(name: str):
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                if profiler is None:
+                    return await func(*args, **kwargs)
+
+                with Span(profiler, name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if profiler is None:
+                return func(*args, **kwargs)
+
+            with Span(profiler, name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def count_statement(*args) -> None:
+    profiler.statements += 1
+    for active in active_spans.get():
+        active.statements += 1
+
+
+def start_flush(session, *args) -> None:
+    session.info["profiling_flush"] = span("flush")
+    session.info["profiling_flush"].__enter__()
+
+
+def end_flush(session, *args) -> None:
+    session.info.pop("profiling_flush").__exit__(None, None, None)
+
+
+def start_commit(session) -> None:
+    session.info["profiling_commit"] = span("commit")
+    session.info["profiling_commit"].__enter__()
+
+
+def end_commit(session) -> None:
+    if "profiling_commit" in session.info:
+        session.info.pop("profiling_commit").__exit__(None, None, None)
+
+
+def register(engine: AsyncEngine) -> None:
+    # Engines created after profiling is enabled, like the temporary database
+    # of the benchmarks, have to be registered to count their statements.
+    event.listen(engine.sync_engine, "before_cursor_execute", count_statement)
+
+
+def enable(*engines: AsyncEngine) -> "Profiler":
+    global profiler
+    profiler = Profiler()
+
+    for engine in engines:
+        register(engine)
+    event.listen(Session, "before_flush", start_flush)
+    event.listen(Session, "after_flush_postexec", end_flush)
+    event.listen(Session, "before_commit", start_commit)
+    event.listen(Session, "after_commit", end_commit)
+    event.listen(Session, "after_rollback", end_commit)
+    return profiler
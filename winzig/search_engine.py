@@ -1,9 +1,81 @@
-from sqlalchemy import func, or_, select
+import asyncio
+import re
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from itertools import chain
+from sqlalchemy import case, func, or_, select
 from sqlalchemy.ext.asyncio import AsyncSession
-from winzig.models import Post, Occurrence, Keyword
-from winzig.utils import update_url_scores, normalize_text
+from winzig.analysis import Analyzer, load_analyzer
+from winzig.compression import ContentCodec, load_content_codec
+from winzig.models import Feed, Post, PostContent, Occurrence, Keyword
+from winzig.profiling import traced
+from winzig.segment import Segment, open_segment
+from winzig.snippets import SNIPPET_SOURCE_LENGTH, make_snippet
+from winzig.term_dictionary import WILDCARDS, TermDictionary, build_term_dictionary
+from winzig.utils import get_top_urls, update_url_scores, normalize_text
 from winzig.console import console
 
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+SUPPORTED_FILTERS = ("domain", "feed", "published")
+BACKENDS = ("python", "numpy")
+STREAM_PARTITION_SIZE = 10_000
+
+
+def rows_to_array(rows: list, width: int = 2):
+    # np.array() on SQLAlchemy rows is very slow, flattening them first isn't.
+    count = len(rows) * width
+    flat = np.fromiter(chain.from_iterable(rows), dtype=np.int64, count=count)
+    return flat.reshape(-1, width)
+
+
+def available_backends() -> tuple[str, ...]:
+    return BACKENDS if np is not None else ("python",)
+
+
+def default_backend() -> str:
+    return available_backends()[-1]
+
+
+def split_filter_values(value: str) -> list[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def parse_date_range(value: str) -> tuple[datetime | None, datetime | None]:
+    start, sep, end = value.partition("..")
+    if not sep:
+        end = start
+
+    start_date = datetime.fromisoformat(start.strip()) if start.strip() else None
+    end_date = None
+    if end.strip():
+        end_date = datetime.fromisoformat(end.strip())
+        if len(end.strip()) == 10:
+            end_date += timedelta(days=1)
+
+    return start_date, end_date
+
+
+def parse_query(query: str, analyzer: Analyzer) -> list[str]:
+    tokens = []
+    for token in query.split():
+        if not any(char in WILDCARDS for char in token):
+            tokens.extend(analyzer(token))
+            continue
+
+        parts = re.split(r"([*?])", token.lower())
+        tokens.append(
+            "".join(
+                part if part in WILDCARDS else normalize_text(part).replace(" ", "")
+                for part in parts
+            )
+        )
+
+    return tokens
+
 
 class SearchEngine:
     def __init__(
@@ -12,18 +84,88 @@ class SearchEngine:
         filters: dict[str, str] = {},
         k1: float = 1.5,
         b: float = 0.75,
+        fuzzy: bool = True,
+        max_distance: int = 1,
+        max_expansions: int = 10,
+        backend: str | None = None,
+        cache_size: int = 256,
+        stats=None,
+        use_segment: bool = True,
     ) -> None:
+        self.backend = backend or default_backend()
+        if self.backend == "numpy" and np is None:
+            raise ValueError("The 'numpy' backend requires NumPy to be installed")
+
         self.session = session
         self.filters = filters
         self.k1 = k1
         self.b = b
+        self.fuzzy = fuzzy
+        self.max_distance = max_distance
+        self.max_expansions = max_expansions
+        self.cache_size = cache_size
+        # Collection-wide statistics (IDF and average document length) are
+        # read from here instead of this database when it's one of several
+        # shards, so scores from all the shards are comparable.
+        self.stats = stats
+        self.use_segment = use_segment
 
         self._avdl = None
+        self._analyzer = None
+        self._content_codec = None
+        self._term_dictionary = None
+        self._allowed_posts = self.build_allowed_posts()
+        self._doc_lengths = None
+        self._allowed_mask = None
+        self._postings_cache = OrderedDict()
+        self._segment = None
+        self._segment_loaded = False
+        self._allowed_docs = None
+
+    def build_allowed_posts(self):
+        conditions = []
+        if "domain" in self.filters:
+            domains = split_filter_values(self.filters["domain"])
+            conditions.append(
+                or_(
+                    Post.domain.in_(domains),
+                    Post.host.in_(domains),
+                    Post.registered_domain.in_(domains),
+                )
+            )
+
+        if "feed" in self.filters:
+            feeds = split_filter_values(self.filters["feed"])
+            feed_ids = select(Feed.id).where(
+                or_(Feed.url.in_(feeds), Feed.title.in_(feeds))
+            )
+            conditions.append(Post.feed_id.in_(feed_ids))
+
+        if "published" in self.filters:
+            start, end = parse_date_range(self.filters["published"])
+            if start:
+                conditions.append(Post.published >= start)
+            if end:
+                conditions.append(Post.published < end)
+
+        if not conditions:
+            return None
+
+        return select(Post.id).where(*conditions)
 
     async def avdl(self) -> float | None:
         if self._avdl is not None:
             return self._avdl
 
+        if self.stats is not None:
+            self._avdl = await self.stats.avdl()
+            return self._avdl
+
+        segment = await self.segment()
+        if segment is not None:
+            self._avdl = segment.avdl()
+            return self._avdl
+
         statement = select(func.count()).select_from(Post)
         result = await self.session.execute(statement)
         total_posts = result.scalar()
@@ -43,44 +185,402 @@ class SearchEngine:
         self._avdl = total_length / total_posts
         return self._avdl
 
-    async def get_kw_score(self, kw: str) -> float:
-        statement = select(Keyword).where(Keyword.keyword == kw)
+    @traced("get_kw_scores")
+    async def get_kw_scores(self, terms: list[str]) -> dict[str, float]:
+        if self.stats is not None:
+            return await self.stats.kw_scores(terms)
+
+        segment = await self.segment()
+        if segment is not None:
+            term_ids = {term: segment.find_term(term) for term in terms}
+            return {
+                term: segment.scores[idx]
+                for term, idx in term_ids.items()
+                if idx is not None
+            }
+
+        statement = select(Keyword.keyword, Keyword.score).where(
+            Keyword.keyword.in_(terms)
+        )
         results = await self.session.execute(statement)
-        keyword = results.scalar()
-        if not keyword:
-            return 0.0
+        return dict(results.all())
 
-        return keyword.score
+    async def cached_postings(self, terms: list[str], fetch) -> dict:
+        # Postings don't depend on k1 and b, so they are kept around and
+        # reused by later queries sharing terms, e.g. while typing a query.
+        missing = [term for term in terms if term not in self._postings_cache]
+        if missing:
+            self._postings_cache.update(await fetch(missing))
 
-    async def bm25(self, kw: str) -> dict[str, float]:
-        avdl = await self.avdl()
-        statement = select(Occurrence, Post).join(Post).where(Occurrence.word == kw)
-        if "domain" in self.filters:
-            domain_filters = self.filters["domain"].split(",")
-            conditions = [Post.domain == domain.strip() for domain in domain_filters]
-            statement = statement.filter(or_(*conditions))
+        postings = {}
+        for term in terms:
+            self._postings_cache.move_to_end(term)
+            postings[term] = self._postings_cache[term]
+
+        while len(self._postings_cache) > self.cache_size:
+            self._postings_cache.popitem(last=False)
+
+        return postings
+
+    def clear_cache(self) -> None:
+        self._postings_cache.clear()
+
+    @traced("fetch_postings")
+    async def fetch_postings(self, terms: list[str]) -> dict[str, tuple]:
+        # The postings of all the terms are fetched with a single query
+        # instead of one round trip per term.
+        kw_scores = await self.get_kw_scores(terms)
+        segment = await self.segment()
+        if segment is not None:
+            return await self.fetch_segment_postings(segment, terms, kw_scores)
+
+        statement = (
+            select(Occurrence.word, Occurrence.count, Post.url, Post.length)
+            .join(Post)
+            .where(Occurrence.word.in_(terms))
+        )
+        if self._allowed_posts is not None:
+            statement = statement.where(Occurrence.post_id.in_(self._allowed_posts))
 
         results = await self.session.execute(statement)
-        occurrences = results.fetchall()
+
+        postings = {term: (kw_scores.get(term, 0.0), []) for term in terms}
+        for word, count, url, length in results:
+            postings[word][1].append((count, url, length))
+
+        return postings
+
+    async def segment(self) -> Segment | None:
+        if not self._segment_loaded:
+            self._segment = (
+                await open_segment(self.session) if self.use_segment else None
+            )
+            self._segment_loaded = True
+
+        return self._segment
+
+    async def allowed_docs(self, segment: Segment) -> set[int] | None:
+        if self._allowed_posts is None:
+            return None
+
+        if self._allowed_docs is None:
+            results = await self.session.execute(self._allowed_posts)
+            self._allowed_docs = set(segment.find_docs(results.scalars()))
+
+        return self._allowed_docs
+
+    async def fetch_segment_postings(
+        self, segment: Segment, terms: list[str], kw_scores: dict[str, float]
+    ) -> dict[str, tuple]:
+        allowed = await self.allowed_docs(segment)
+        postings = {}
+        for term in terms:
+            occurrences = []
+            idx = segment.find_term(term)
+            if idx is not None:
+                docs, counts = segment.postings(idx)
+                occurrences = [
+                    (count, segment.url(doc), segment.doc_lengths[doc])
+                    for doc, count in zip(docs, counts)
+                    if allowed is None or doc in allowed
+                ]
+
+            postings[term] = (kw_scores.get(term, 0.0), occurrences)
+
+        return postings
+
+    @traced("bm25")
+    async def bm25(self, terms: list[str]) -> dict[str, dict[str, float]]:
+        avdl = await self.avdl()
+        postings = await self.cached_postings(terms, self.fetch_postings)
 
         search_results = {}
-        for occurrence, post in occurrences:
-            kw_score = await self.get_kw_score(kw)
-            numerator = occurrence.count * (self.k1 + 1)
-            denominator = occurrence.count + self.k1 * (
-                1 - self.b + self.b * (post.length / avdl)
+        for term, (kw_score, occurrences) in postings.items():
+            scores = {}
+            for count, url, length in occurrences:
+                numerator = count * (self.k1 + 1)
+                denominator = count + self.k1 * (1 - self.b + self.b * (length / avdl))
+                scores[url] = kw_score * numerator / denominator
+
+            search_results[term] = scores
+
+        return search_results
+
+    async def analyzer(self) -> Analyzer:
+        if self._analyzer is None:
+            self._analyzer = await load_analyzer(self.session)
+
+        return self._analyzer
+
+    async def content_codec(self) -> ContentCodec:
+        if self._content_codec is None:
+            self._content_codec = await load_content_codec(self.session)
+
+        return self._content_codec
+
+    async def term_dictionary(self) -> TermDictionary:
+        if self._term_dictionary is not None:
+            return self._term_dictionary
+
+        if self.stats is not None:
+            self._term_dictionary = await self.stats.term_dictionary(self.max_distance)
+            return self._term_dictionary
+
+        segment = await self.segment()
+        if segment is not None:
+            self._term_dictionary = segment.term_dictionary(self.max_distance)
+            return self._term_dictionary
+
+        # Loading the whole vocabulary takes a while on large indexes, so the
+        # rows are streamed in partitions, already sorted by SQLite, and the
+        # dictionary is built off the event loop, which the TUI also draws from.
+        statement = select(Keyword.keyword, Keyword.frequency).order_by(Keyword.keyword)
+        results = await self.session.stream(statement)
+        rows = []
+        async for partition in results.partitions(STREAM_PARTITION_SIZE):
+            rows.extend(partition)
+
+        self._term_dictionary = await asyncio.to_thread(
+            build_term_dictionary, rows, max_distance=self.max_distance
+        )
+        return self._term_dictionary
+
+    async def expand_term(self, token: str) -> list[tuple[str, float]]:
+        if any(char in WILDCARDS for char in token):
+            terms = await self.term_dictionary()
+            return [(term, 1.0) for term in terms.wildcard(token, self.max_expansions)]
+
+        if not self.fuzzy or len(token) <= 3:
+            return [(token, 1.0)]
+
+        # Terms in the index are checked with the same lookup used to score
+        # them, so the term dictionary is only loaded for misses.
+        if token in await self.get_kw_scores([token]):
+            return [(token, 1.0)]
+
+        terms = await self.term_dictionary()
+        matches = await asyncio.to_thread(terms.fuzzy, token, self.max_expansions)
+        return [(term, 1 / (1 + distance)) for term, distance in matches]
+
+    async def load_doc_lengths(self):
+        if self._doc_lengths is not None:
+            return self._doc_lengths
+
+        segment = await self.segment()
+        if segment is not None:
+            # Documents are numbered by the segment, so its array of lengths
+            # is used in place, without reading the posts table.
+            self._doc_lengths = np.asarray(segment.doc_lengths)
+            allowed = await self.allowed_docs(segment)
+            if allowed is not None:
+                self._allowed_mask = np.zeros(segment.doc_count, dtype=bool)
+                self._allowed_mask[list(allowed)] = True
+
+            return self._doc_lengths
+
+        # Dense arrays indexed by post id, so postings can be scored and
+        # filtered with a single fancy-indexing operation.
+        results = await self.session.execute(select(Post.id, Post.length))
+        rows = rows_to_array(results.all())
+        size = int(rows[:, 0].max()) + 1 if len(rows) else 0
+        self._doc_lengths = np.zeros(size, dtype=np.float64)
+        self._doc_lengths[rows[:, 0]] = rows[:, 1]
+
+        if self._allowed_posts is not None:
+            results = await self.session.execute(self._allowed_posts)
+            allowed = np.fromiter(results.scalars(), dtype=np.int64)
+            self._allowed_mask = np.zeros(size, dtype=bool)
+            self._allowed_mask[allowed] = True
+
+        return self._doc_lengths
+
+    @traced("fetch_postings_vectorized")
+    async def fetch_postings_vectorized(self, terms: list[str]) -> dict[str, tuple]:
+        doc_lengths = await self.load_doc_lengths()
+        kw_scores = await self.get_kw_scores(terms)
+        segment = await self.segment()
+        if segment is not None:
+            return self.fetch_segment_postings_vectorized(segment, terms, kw_scores)
+
+        term_ids = case(
+            {term: idx for idx, term in enumerate(terms)}, value=Occurrence.word
+        )
+        statement = select(term_ids, Occurrence.post_id, Occurrence.count).where(
+            Occurrence.word.in_(terms)
+        )
+        # Core execution skips the ORM result processing, which dominates the
+        # time spent on long posting lists.
+        conn = await self.session.connection()
+        results = await conn.execute(statement)
+        rows = rows_to_array(results.all(), width=3)
+
+        keep = rows[:, 1] < len(doc_lengths)
+        if self._allowed_mask is not None:
+            keep[keep] = self._allowed_mask[rows[keep, 1]]
+
+        rows = rows[keep]
+        rows = rows[np.argsort(rows[:, 0], kind="stable")]
+        bounds = np.searchsorted(rows[:, 0], np.arange(len(terms) + 1))
+
+        postings = {}
+        for idx, term in enumerate(terms):
+            term_rows = rows[bounds[idx] : bounds[idx + 1]]
+            postings[term] = (
+                kw_scores.get(term, 0.0),
+                term_rows[:, 1],
+                term_rows[:, 2].astype(np.float64),
             )
 
-            score = kw_score * numerator / denominator
-            search_results[post.url] = score
+        return postings
+
+    def fetch_segment_postings_vectorized(
+        self, segment: Segment, terms: list[str], kw_scores: dict[str, float]
+    ) -> dict[str, tuple]:
+        postings = {}
+        for term in terms:
+            docs = np.empty(0, dtype=np.int64)
+            counts = np.empty(0, dtype=np.float64)
+            idx = segment.find_term(term)
+            if idx is not None:
+                term_docs, term_counts = segment.postings(idx)
+                docs = np.asarray(term_docs).astype(np.int64)
+                counts = np.asarray(term_counts).astype(np.float64)
+                if self._allowed_mask is not None:
+                    keep = self._allowed_mask[docs]
+                    docs, counts = docs[keep], counts[keep]
+
+            postings[term] = (kw_scores.get(term, 0.0), docs, counts)
+
+        return postings
+
+    @traced("bm25_vectorized")
+    async def bm25_vectorized(self, terms: list[str]):
+        doc_lengths = await self.load_doc_lengths()
+        avdl = await self.avdl()
+        postings = await self.cached_postings(terms, self.fetch_postings_vectorized)
+
+        search_results = {}
+        for term, (kw_score, post_ids, tf) in postings.items():
+            norm = self.k1 * (1 - self.b + self.b * doc_lengths[post_ids] / avdl)
+            scores = kw_score * tf * (self.k1 + 1) / (tf + norm)
+            search_results[term] = (post_ids, scores)
 
         return search_results
 
-    async def search(self, query: str) -> dict[str, float]:
-        keywords = normalize_text(query).split(" ")
+    @traced("resolve_urls")
+    async def resolve_urls(self, post_ids: list[int]) -> dict[int, str]:
+        segment = await self.segment()
+        if segment is not None:
+            return {doc: segment.url(doc) for doc in post_ids}
+
+        urls = {}
+        for i in range(0, len(post_ids), 500):
+            statement = select(Post.id, Post.url).where(
+                Post.id.in_(post_ids[i : i + 500])
+            )
+            results = await self.session.execute(statement)
+            urls.update(results.all())
+
+        return urls
+
+    async def search_vectorized(
+        self, expansions: list[list[tuple[str, float]]], n: int | None
+    ):
+        doc_lengths = await self.load_doc_lengths()
+        if not len(doc_lengths):
+            return {}
+
+        terms = list({term for token in expansions for term, _ in token})
+        term_scores = await self.bm25_vectorized(terms)
+
+        totals = np.zeros(len(doc_lengths), dtype=np.float64)
+        matched = np.zeros(len(doc_lengths), dtype=bool)
+        for token in expansions:
+            if not token:
+                continue
+
+            post_ids = np.concatenate([term_scores[term][0] for term, _ in token])
+            scores = np.concatenate(
+                [term_scores[term][1] * weight for term, weight in token]
+            )
+            if len(token) > 1:
+                # Keep the best scoring expansion of the token for each post.
+                order = np.argsort(-scores, kind="stable")
+                post_ids, first = np.unique(post_ids[order], return_index=True)
+                scores = scores[order][first]
+
+            np.add.at(totals, post_ids, scores)
+            matched[post_ids] = True
+
+        candidates = np.flatnonzero(matched)
+        if n is not None and len(candidates) > n:
+            top = np.argpartition(-totals[candidates], n - 1)[:n]
+            candidates = candidates[top]
+
+        candidates = candidates[np.argsort(-totals[candidates], kind="stable")]
+        urls = await self.resolve_urls(candidates.tolist())
+        return {urls[idx]: float(totals[idx]) for idx in candidates if idx in urls}
+
+    @traced("expand_query")
+    async def expand_query(self, query: str) -> list[list[tuple[str, float]]]:
+        tokens = parse_query(query, await self.analyzer())
+        return [await self.expand_term(token) for token in tokens]
+
+    @traced("search")
+    async def search(self, query: str, n: int | None = None) -> dict[str, float]:
+        expansions = await self.expand_query(query)
+        if not any(expansions):
+            return {}
+
+        if self.backend == "numpy":
+            return await self.search_vectorized(expansions, n)
+
+        terms = list({term for token in expansions for term, _ in token})
+        term_scores = await self.bm25(terms)
+
         url_scores: dict[str, float] = {}
-        for kw in keywords:
-            kw_urls_scores = await self.bm25(kw)
-            url_scores = update_url_scores(url_scores, kw_urls_scores)
+        for token in expansions:
+            # Expansions of the same token are alternatives, so a post only
+            # keeps the score of its best matching expansion.
+            token_scores: dict[str, float] = {}
+            for term, weight in token:
+                for url, score in term_scores[term].items():
+                    score *= weight
+                    if url not in token_scores or score > token_scores[url]:
+                        token_scores[url] = score
+
+            url_scores = update_url_scores(url_scores, token_scores)
+
+        if n is not None:
+            return get_top_urls(url_scores, n)
 
         return url_scores
+
+    @traced("snippets")
+    async def snippets(self, query: str, urls: list[str]) -> dict[str, str]:
+        expansions = await self.expand_query(query)
+        terms = {term for token in expansions for term, _ in token}
+        analyzer = await self.analyzer()
+        content_codec = await self.content_codec()
+
+        # Content is loaded in a single query, but only a prefix of each post
+        # is decompressed since posts can be arbitrarily long.
+        statement = (
+            select(
+                Post.url, PostContent.codec, PostContent.dictionary_id, PostContent.data
+            )
+            .join(PostContent)
+            .where(Post.url.in_(urls))
+        )
+        results = await self.session.execute(statement)
+
+        return {
+            url: make_snippet(
+                content_codec.decode(
+                    codec, dictionary_id, data, max_length=SNIPPET_SOURCE_LENGTH
+                ),
+                analyzer,
+                terms,
+            )
+            for url, codec, dictionary_id, data in results
+        }
@@ -0,0 +1,299 @@
+import mmap
+import os
+import struct
+import sys
+import zlib
+from array import array
+from bisect import bisect_left
+from pathlib import Path
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from winzig.settings import get_setting
+from winzig.term_dictionary import (
+    MAX_DISTANCE,
+    PREFIX_LENGTH,
+    TermDictionary,
+    deletes,
+)
+from winzig.console import console
+
+MAGIC = b"WZSEG\x00\x00\x00"
+VERSION = 2
+ALIGNMENT = 8
+
+# Sections in the order they're written, with the typecode of their items.
+# Postings are stored per term as two parallel arrays of document indexes and
+# counts, and documents are numbered by their position in the posts table.
+# The deletes used by fuzzy lookups are stored sorted, as the crc32 of each
+# delete in the high half of an item and the index of its term in the low half.
+SECTIONS = (
+    ("term_offsets", "Q"),
+    ("terms", "B"),
+    ("scores", "d"),
+    ("frequencies", "Q"),
+    ("posting_offsets", "Q"),
+    ("posting_docs", "I"),
+    ("posting_counts", "I"),
+    ("doc_lengths", "I"),
+    ("post_ids", "q"),
+    ("url_offsets", "Q"),
+    ("urls", "B"),
+    ("deletes", "Q"),
+)
+
+# Magic, version, byte order, maximum distance and prefix length of the
+# deletes, index generation, total length of the posts, and the offset and
+# number of items of every section.
+HEADER = struct.Struct(f"=8sI2sBBQQ{len(SECTIONS) * 2}Q")
+# Items are stored in the byte order of the machine that compiled the segment,
+# so they can be read in place without any conversion.
+BYTE_ORDER = b"LE" if sys.byteorder == "little" else b"BE"
+
+
+def segment_path(engine: AsyncEngine) -> Path | None:
+    database = engine.url.database
+    if not database or database == ":memory:":
+        return None
+
+    return Path(database).with_suffix(".seg")
+
+
+def end_term(data: dict[str, array], term: str, score: float, frequency: int):
+    idx = len(data["scores"])
+    for edit in deletes(term[:PREFIX_LENGTH], MAX_DISTANCE):
+        data["deletes"].append(zlib.crc32(edit.encode()) << 32 | idx)
+
+    data["terms"].frombytes(term.encode())
+    data["term_offsets"].append(len(data["terms"]))
+    data["scores"].append(score)
+    data["frequencies"].append(frequency)
+    data["posting_offsets"].append(len(data["posting_docs"]))
+
+
+def write_segment(conn, path: Path) -> dict[str, int]:
+    data = {name: array(typecode) for name, typecode in SECTIONS}
+
+    # Everything is read in a single transaction, so the segment matches the
+    # generation it's tagged with even if the index is being updated.
+    conn.exec_driver_sql("BEGIN")
+    results = conn.exec_driver_sql(
+        "SELECT value FROM settings WHERE key = 'index_generation'"
+    )
+    generation = int(results.scalar() or 0)
+
+    doc_indexes = {}
+    data["url_offsets"].append(0)
+    results = conn.exec_driver_sql("SELECT id, length, url FROM posts ORDER BY id")
+    for post_id, length, url in results:
+        doc_indexes[post_id] = len(data["post_ids"])
+        data["post_ids"].append(post_id)
+        data["doc_lengths"].append(length or 0)
+        data["urls"].frombytes(url.encode())
+        data["url_offsets"].append(len(data["urls"]))
+
+    results = conn.exec_driver_sql("SELECT keyword, score FROM keywords")
+    scores = dict(results.all())
+
+    # The (word, post_id, count) index returns the occurrences already sorted,
+    # and SQLite sorts words by their UTF-8 bytes, like lookups expect.
+    data["term_offsets"].append(0)
+    data["posting_offsets"].append(0)
+    current = None
+    frequency = 0
+    results = conn.exec_driver_sql(
+        "SELECT word, post_id, count FROM occurrences ORDER BY word, post_id"
+    )
+    for word, post_id, count in results:
+        doc = doc_indexes.get(post_id)
+        if doc is None:
+            continue
+
+        if word != current:
+            if current is not None:
+                end_term(data, current, scores.get(current, 0.0), frequency)
+
+            current = word
+            frequency = 0
+
+        data["posting_docs"].append(doc)
+        data["posting_counts"].append(count)
+        frequency += count
+
+    if current is not None:
+        end_term(data, current, scores.get(current, 0.0), frequency)
+
+    conn.rollback()
+    data["deletes"] = array("Q", sorted(data["deletes"]))
+
+    # Written next to the final file and renamed, so processes that have the
+    # previous segment mapped keep reading a consistent copy.
+    temp_path = path.with_suffix(".seg.tmp")
+    with open(temp_path, "wb") as f:
+        f.write(bytes(HEADER.size))
+        sections = []
+        for name, _ in SECTIONS:
+            f.write(bytes(-f.tell() % ALIGNMENT))
+            sections.extend((f.tell(), len(data[name])))
+            data[name].tofile(f)
+
+        f.seek(0)
+        total_length = sum(data["doc_lengths"])
+        f.write(
+            HEADER.pack(
+                MAGIC,
+                VERSION,
+                BYTE_ORDER,
+                MAX_DISTANCE,
+                PREFIX_LENGTH,
+                generation,
+                total_length,
+                *sections,
+            )
+        )
+
+    os.replace(temp_path, path)
+    return {
+        "docs": len(data["post_ids"]),
+        "terms": len(data["scores"]),
+        "postings": len(data["posting_docs"]),
+    }
+
+
+class Segment:
+    def __init__(self, path: Path) -> None:
+        # The file is only mapped, every section is a view of the page cache
+        # that is shared with the other processes reading the same segment.
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (
+            magic,
+            version,
+            byte_order,
+            self.max_distance,
+            self.prefix_length,
+            self.generation,
+            self.total_length,
+            *sections,
+        ) = HEADER.unpack_from(self._mmap)
+        if magic != MAGIC or version != VERSION or byte_order != BYTE_ORDER:
+            raise ValueError(f"'{path}' isn't a segment compiled by this version")
+
+        view = memoryview(self._mmap)
+        for idx, (name, typecode) in enumerate(SECTIONS):
+            offset, count = sections[idx * 2], sections[idx * 2 + 1]
+            size = count * array(typecode).itemsize
+            setattr(self, name, view[offset : offset + size].cast(typecode))
+
+        self.doc_count = len(self.post_ids)
+        self.term_count = len(self.scores)
+
+    def avdl(self) -> float | None:
+        if not self.doc_count or not self.total_length:
+            return None
+
+        return self.total_length / self.doc_count
+
+    def term(self, idx: int) -> bytes:
+        return self.terms[self.term_offsets[idx] : self.term_offsets[idx + 1]].tobytes()
+
+    def find_term(self, term: str) -> int | None:
+        key = term.encode()
+        idx = bisect_left(range(self.term_count), key, key=self.term)
+        if idx < self.term_count and self.term(idx) == key:
+            return idx
+
+        return None
+
+    def term_dictionary(self, max_distance: int) -> TermDictionary:
+        # Terms are decoded only as lookups reach them, and the stored deletes
+        # are used unless they were compiled for a different distance.
+        stored = max_distance == self.max_distance
+        return TermDictionary(
+            SegmentTerms(self),
+            self.frequencies,
+            max_distance=max_distance,
+            prefix_length=self.prefix_length if stored else PREFIX_LENGTH,
+            deletes=SegmentDeletes(self) if stored else None,
+        )
+
+    def postings(self, idx: int) -> tuple[memoryview, memoryview]:
+        start, end = self.posting_offsets[idx], self.posting_offsets[idx + 1]
+        return self.posting_docs[start:end], self.posting_counts[start:end]
+
+    def url(self, doc: int) -> str:
+        start, end = self.url_offsets[doc], self.url_offsets[doc + 1]
+        return self.urls[start:end].tobytes().decode()
+
+    def find_docs(self, post_ids) -> list[int]:
+        docs = []
+        for post_id in post_ids:
+            doc = bisect_left(self.post_ids, post_id)
+            if doc < self.doc_count and self.post_ids[doc] == post_id:
+                docs.append(doc)
+
+        return docs
+
+
+class SegmentTerms:
+    def __init__(self, segment: Segment) -> None:
+        self.segment = segment
+
+    def __len__(self) -> int:
+        return self.segment.term_count
+
+    def __getitem__(self, idx: int) -> str:
+        return self.segment.term(idx).decode()
+
+
+class SegmentDeletes:
+    def __init__(self, segment: Segment) -> None:
+        self.segment = segment
+
+    def get(self, edit: str, default=()) -> list[int]:
+        # Deletes with the same crc32 are all returned, collisions only add
+        # candidates that are discarded after checking their distance.
+        key = zlib.crc32(edit.encode()) << 32
+        start = bisect_left(self.segment.deletes, key)
+        end = bisect_left(self.segment.deletes, key + (1 << 32), lo=start)
+        if start == end:
+            return default
+
+        return [item & 0xFFFFFFFF for item in self.segment.deletes[start:end]]
+
+
+async def open_segment(session: AsyncSession) -> Segment | None:
+    path = segment_path(session.bind)
+    if path is None or not path.exists():
+        return None
+
+    try:
+        segment = Segment(path)
+    except (OSError, ValueError, struct.error) as e:
+        console.log(f"[yellow bold]WARNING[/yellow bold]: Ignoring '{path}': {e}")
+        return None
+
+    generation = int(await get_setting(session, "index_generation") or 0)
+    if segment.generation != generation:
+        console.log(
+            f"[yellow bold]WARNING[/yellow bold]: The index changed since '{path}' was compiled, run 'winzig index compile' to update it"
+        )
+        return None
+
+    return segment
+
+
+async def compile_segment(engine: AsyncEngine) -> None:
+    path = segment_path(engine)
+    if path is None:
+        console.log(
+            "[red bold]ERROR[/red bold]: Only databases in a file can be compiled"
+        )
+        return
+
+    with console.status(f"Compiling '{path}'...", spinner="earth"):
+        async with engine.connect() as conn:
+            counts = await conn.run_sync(write_segment, path)
+
+    console.log(
+        f"[green bold]SUCCESS[/green bold]: Compiled {counts['terms']} terms, {counts['postings']} postings and {counts['docs']} posts into '{path}' ({path.stat().st_size / 1e6:.2f} MB)"
+    )
@@ -0,0 +1,14 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from winzig.models import Setting
+
+
+async def get_setting(session: AsyncSession, key: str) -> str | None:
+    setting = await session.get(Setting, key)
+    if not setting:
+        return None
+
+    return setting.value
+
+
+async def set_setting(session: AsyncSession, key: str, value: str) -> None:
+    await session.merge(Setting(key=key, value=value))
@@ -0,0 +1,446 @@
+import asyncio
+import heapq
+import zlib
+from collections import Counter
+from contextlib import AsyncExitStack
+from itertools import batched, groupby
+from math import log
+from operator import itemgetter
+from pathlib import Path
+from rich.table import Table
+from sqlalchemy import delete, func, select
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession
+from winzig.crawler import crawl_from_feeds, crawl_links
+from winzig.database import create_db_and_tables, get_engine
+from winzig.http import REQUEST_INTERVAL, HttpClient
+from winzig.models import (
+    CompressionDictionary,
+    Feed,
+    Keyword,
+    LocalFile,
+    Occurrence,
+    Post,
+    PostContent,
+    Setting,
+)
+from winzig.search_engine import STREAM_PARTITION_SIZE, SearchEngine
+from winzig.term_dictionary import TermDictionary, build_term_dictionary
+from winzig.tf_idf import recalculate_tf_idf
+from winzig.utils import get_top_urls
+from winzig.console import console
+
+SHARD_PATTERN = "shard-*.db"
+
+
+def shard_path(shards_dir: Path, idx: int) -> Path:
+    return shards_dir / f"shard-{idx:03d}.db"
+
+
+def get_shard_engines(shards_dir: Path) -> list[AsyncEngine]:
+    return [
+        get_engine(f"sqlite+aiosqlite:///{path}")
+        for path in sorted(shards_dir.glob(SHARD_PATTERN))
+    ]
+
+
+def get_index_engines(obj: dict) -> list[AsyncEngine]:
+    # Once the index is split, the posts live in the shards and the main
+    # database only keeps the settings.
+    return obj["shards"] or [obj["engine"]]
+
+
+def shard_index(key: str, count: int) -> int:
+    # crc32 is stable across runs, unlike hash(), so a feed is always routed
+    # to the same shard.
+    return zlib.crc32(key.strip().encode()) % count
+
+
+def route_urls(urls: list[str], count: int) -> list[list[str]]:
+    groups = [[] for _ in range(count)]
+    for url in urls:
+        groups[shard_index(url, count)].append(url)
+
+    return groups
+
+
+async def find_posts(engines: list[AsyncEngine], urls: list[str]) -> set[str]:
+    async def query(engine: AsyncEngine) -> set[str]:
+        found = set()
+        async with AsyncSession(engine) as session:
+            for chunk in batched(urls, 500):
+                results = await session.execute(
+                    select(Post.url).where(Post.url.in_(chunk))
+                )
+                found.update(results.scalars())
+
+        return found
+
+    results = await asyncio.gather(*(query(engine) for engine in engines))
+    return set().union(*results)
+
+
+async def route_posts(
+    session: AsyncSession, count: int
+) -> tuple[list[list[int]], dict[int, int]]:
+    # Posts go to the shard of their feed, so per-feed queries like the ones
+    # made while crawling only need one shard.
+    results = await session.execute(select(Feed.id, Feed.url))
+    feed_shards = {feed_id: shard_index(url, count) for feed_id, url in results}
+
+    groups = [[] for _ in range(count)]
+    results = await session.execute(select(Post.id, Post.url, Post.feed_id))
+    for post_id, url, feed_id in results:
+        idx = feed_shards.get(feed_id)
+        if idx is None:
+            idx = shard_index(url, count)
+
+        groups[idx].append(post_id)
+
+    return groups, feed_shards
+
+
+def copy_rows(conn, table, condition: str | None = None) -> None:
+    # Columns are listed explicitly since migrated databases can have them in
+    # a different order than new ones.
+    columns = ", ".join(column.name for column in table.__table__.columns)
+    statement = f"INSERT INTO main.{table.__tablename__} ({columns}) SELECT {columns} FROM source.{table.__tablename__}"
+    if condition:
+        statement += f" WHERE {condition}"
+
+    conn.exec_driver_sql(statement)
+
+
+def fill_shard(conn, source: str, feed_ids: list[int], post_ids: list[int]) -> None:
+    conn.exec_driver_sql("ATTACH DATABASE ? AS source", (source,))
+    try:
+        conn.exec_driver_sql("CREATE TEMP TABLE routed_feeds (id INTEGER PRIMARY KEY)")
+        conn.exec_driver_sql("CREATE TEMP TABLE routed_posts (id INTEGER PRIMARY KEY)")
+        # An empty list of parameters would run the statement once without
+        # any, instead of not running it.
+        if feed_ids:
+            conn.exec_driver_sql(
+                "INSERT INTO temp.routed_feeds VALUES (?)",
+                [(feed_id,) for feed_id in feed_ids],
+            )
+        if post_ids:
+            conn.exec_driver_sql(
+                "INSERT INTO temp.routed_posts VALUES (?)",
+                [(post_id,) for post_id in post_ids],
+            )
+
+        copy_rows(conn, Setting)
+        copy_rows(conn, CompressionDictionary)
+        copy_rows(conn, Feed, "id IN (SELECT id FROM temp.routed_feeds)")
+        copy_rows(conn, Post, "id IN (SELECT id FROM temp.routed_posts)")
+        copy_rows(conn, PostContent, "post_id IN (SELECT id FROM temp.routed_posts)")
+        copy_rows(conn, Occurrence, "post_id IN (SELECT id FROM temp.routed_posts)")
+        # Local files without content have no post to follow, they're read
+        # again the next time their directory is indexed.
+        copy_rows(conn, LocalFile, "post_id IN (SELECT id FROM temp.routed_posts)")
+        conn.commit()
+    finally:
+        conn.rollback()
+        conn.exec_driver_sql("DROP TABLE IF EXISTS temp.routed_feeds")
+        conn.exec_driver_sql("DROP TABLE IF EXISTS temp.routed_posts")
+        conn.exec_driver_sql("DETACH DATABASE source")
+
+
+async def split_database(engine: AsyncEngine, shards_dir: Path, count: int) -> None:
+    if any(shards_dir.glob(SHARD_PATTERN)):
+        console.log(
+            f"[red bold]ERROR[/red bold]: The index is already split into shards in '{shards_dir}'"
+        )
+        return
+
+    source = engine.url.database
+    shards_dir.mkdir(parents=True, exist_ok=True)
+
+    async with AsyncSession(engine) as session:
+        post_groups, feed_shards = await route_posts(session, count)
+
+    feed_groups = [[] for _ in range(count)]
+    for feed_id, idx in feed_shards.items():
+        feed_groups[idx].append(feed_id)
+
+    shards = [
+        get_engine(f"sqlite+aiosqlite:///{shard_path(shards_dir, idx)}")
+        for idx in range(count)
+    ]
+    try:
+        with console.status("Splitting the index...", spinner="earth") as status:
+            for idx, shard in enumerate(shards):
+                status.update(
+                    f"[bold][{idx + 1}/{count}][/bold] Filling shard {idx}..."
+                )
+                await create_db_and_tables(shard)
+                async with shard.connect() as conn:
+                    await conn.run_sync(
+                        fill_shard, source, feed_groups[idx], post_groups[idx]
+                    )
+
+        # Every shard scores its own keywords, the global statistics are added
+        # up from them at query time.
+        for shard in shards:
+            async with AsyncSession(shard) as session:
+                await recalculate_tf_idf(session)
+    except Exception as e:
+        # Leftover shards would be used by every other command, so nothing is
+        # kept unless all of them were filled.
+        for shard in shards:
+            await shard.dispose()
+            Path(shard.url.database).unlink(missing_ok=True)
+
+        console.log(f"[red bold]ERROR[/red bold]: Failed to split the index: {e}")
+        return
+
+    async with AsyncSession(engine) as session:
+        for table in (LocalFile, Occurrence, PostContent, Post, Feed, Keyword):
+            await session.execute(delete(table))
+
+        await session.commit()
+
+    async with engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.exec_driver_sql("VACUUM")
+
+    await print_shards(shards)
+    console.log(
+        f"[green bold]SUCCESS[/green bold]: Index split into {count} shards in '{shards_dir}'"
+    )
+
+
+async def print_shards(shards: list[AsyncEngine]) -> None:
+    table = Table(title="Shards")
+    table.add_column("Shard")
+    table.add_column("Feeds", justify="right")
+    table.add_column("Posts", justify="right")
+    table.add_column("Size", justify="right")
+
+    for shard in shards:
+        async with AsyncSession(shard) as session:
+            results = await session.execute(select(func.count()).select_from(Feed))
+            feeds = results.scalar()
+            results = await session.execute(select(func.count()).select_from(Post))
+            posts = results.scalar()
+
+        path = Path(shard.url.database)
+        table.add_row(
+            path.name, str(feeds), str(posts), f"{path.stat().st_size / 1e6:.2f} MB"
+        )
+
+    console.print(table)
+
+
+def merge_frequencies(shard_rows: list[list]):
+    # Every shard returns its terms sorted, so they're merged in order and
+    # the term dictionary doesn't have to sort the whole vocabulary again.
+    merged = heapq.merge(*shard_rows, key=itemgetter(0))
+    for term, rows in groupby(merged, key=itemgetter(0)):
+        yield term, sum(frequency for _, frequency in rows)
+
+
+class ShardStats:
+    def __init__(self, engines: list[AsyncEngine]) -> None:
+        self.engines = engines
+        self._totals = None
+        self._scores = {}
+        self._term_dictionary = None
+        self._lock = asyncio.Lock()
+
+    async def query_all(self, statement) -> list[list]:
+        async def query(engine: AsyncEngine) -> list:
+            # Results are streamed, so loading every keyword of a shard
+            # doesn't block the event loop until all of them are read.
+            async with engine.connect() as conn:
+                results = await conn.stream(statement)
+                rows = []
+                async for partition in results.partitions(STREAM_PARTITION_SIZE):
+                    rows.extend(partition)
+
+                return rows
+
+        return await asyncio.gather(*(query(engine) for engine in self.engines))
+
+    async def load_totals(self) -> tuple[int, int]:
+        if self._totals is None:
+            statement = select(func.count(), func.sum(Post.length)).select_from(Post)
+            rows = await self.query_all(statement)
+            self._totals = (
+                sum(shard_rows[0][0] for shard_rows in rows),
+                sum(shard_rows[0][1] or 0 for shard_rows in rows),
+            )
+
+        return self._totals
+
+    async def avdl(self) -> float | None:
+        async with self._lock:
+            total_posts, total_length = await self.load_totals()
+
+        if not total_posts or not total_length:
+            console.log("[red bold]Error[/red bold]: No posts found")
+            return None
+
+        return total_length / total_posts
+
+    async def kw_scores(self, terms: list[str]) -> dict[str, float]:
+        # Every shard searches the same terms at once, so only the first one
+        # to get here queries the shards and the rest read its results.
+        async with self._lock:
+            missing = [term for term in terms if term not in self._scores]
+            if missing:
+                total_posts, _ = await self.load_totals()
+                statement = select(Keyword.keyword, Keyword.frequency).where(
+                    Keyword.keyword.in_(missing)
+                )
+                frequencies = Counter()
+                for shard_rows in await self.query_all(statement):
+                    frequencies.update(dict(shard_rows))
+
+                for term in missing:
+                    self._scores[term] = (
+                        log(total_posts / (frequencies[term] + 1))
+                        if term in frequencies
+                        else None
+                    )
+
+        return {
+            term: self._scores[term] for term in terms if self._scores[term] is not None
+        }
+
+    async def term_dictionary(self, max_distance: int) -> TermDictionary:
+        async with self._lock:
+            if self._term_dictionary is None:
+                statement = select(Keyword.keyword, Keyword.frequency).order_by(
+                    Keyword.keyword
+                )
+                rows = await self.query_all(statement)
+                self._term_dictionary = await asyncio.to_thread(
+                    build_term_dictionary,
+                    merge_frequencies(rows),
+                    max_distance=max_distance,
+                )
+
+        return self._term_dictionary
+
+
+class ShardedSearchEngine:
+    def __init__(self, sessions: list[AsyncSession], **options) -> None:
+        self.stats = ShardStats([session.bind for session in sessions])
+        self.shards = [
+            SearchEngine(session, stats=self.stats, **options) for session in sessions
+        ]
+
+    @property
+    def k1(self) -> float:
+        return self.shards[0].k1
+
+    @k1.setter
+    def k1(self, value: float) -> None:
+        for shard in self.shards:
+            shard.k1 = value
+
+    @property
+    def b(self) -> float:
+        return self.shards[0].b
+
+    @b.setter
+    def b(self, value: float) -> None:
+        for shard in self.shards:
+            shard.b = value
+
+    async def search(self, query: str, n: int | None = None) -> dict[str, float]:
+        # Each shard runs in its own SQLite connection thread, so they're
+        # searched in parallel. Scores use the global statistics, so the top
+        # n of every shard can be merged directly.
+        results = await asyncio.gather(
+            *(shard.search(query, n) for shard in self.shards)
+        )
+        url_scores = {}
+        for shard_scores in results:
+            url_scores.update(shard_scores)
+
+        return get_top_urls(url_scores, n if n is not None else len(url_scores))
+
+    async def snippets(self, query: str, urls: list[str]) -> dict[str, str]:
+        results = await asyncio.gather(
+            *(shard.snippets(query, urls) for shard in self.shards)
+        )
+        snippets = {}
+        for shard_snippets in results:
+            snippets.update(shard_snippets)
+
+        return snippets
+
+
+async def open_search_engine(
+    stack: AsyncExitStack, engines: list[AsyncEngine], **options
+) -> SearchEngine | ShardedSearchEngine:
+    sessions = [
+        await stack.enter_async_context(AsyncSession(engine)) for engine in engines
+    ]
+    if len(sessions) > 1:
+        return ShardedSearchEngine(sessions, **options)
+
+    return SearchEngine(sessions[0], **options)
+
+
+async def crawl_shard(
+    engine: AsyncEngine,
+    client: HttpClient,
+    feed_urls: list[str] | None,
+    post_urls: list[str],
+    max: int | None,
+) -> None:
+    async with AsyncSession(engine) as session:
+        if feed_urls is not None:
+            await crawl_from_feeds(session, feed_urls, max, client=client)
+
+        if post_urls:
+            await crawl_links(session, post_urls, client=client)
+
+        await recalculate_tf_idf(session)
+
+
+async def crawl_shards(
+    engines: list[AsyncEngine],
+    feed_urls: list[str] | None = None,
+    post_urls: list[str] | None = None,
+    max: int | None = None,
+    request_interval: float = REQUEST_INTERVAL,
+) -> None:
+    # Every shard is written by its own session, so the crawls don't wait on
+    # each other's writes, but they share one client and its limits per host.
+    feed_groups = route_urls(feed_urls or [], len(engines))
+    post_urls = [url.strip() for url in post_urls or []]
+    if feed_urls is None and not post_urls:
+        console.log("[red bold]ERROR[/red bold]: No URLs received")
+        return
+
+    # Posts from feeds live in the shard of their feed, not the one their
+    # URL routes to, so every shard is checked before fetching them again.
+    existing = await find_posts(engines, post_urls)
+    post_groups = route_urls(
+        [url for url in post_urls if url not in existing], len(engines)
+    )
+    if feed_urls is None and not any(post_groups):
+        console.log(
+            "[yellow bold]WARNING[/yellow bold]: All the posts are already in the index"
+        )
+        return
+
+    async with HttpClient(request_interval=request_interval) as client:
+        await asyncio.gather(
+            *(
+                crawl_shard(
+                    engine,
+                    client,
+                    feed_groups[idx] if feed_urls is not None else None,
+                    post_groups[idx],
+                    max,
+                )
+                for idx, engine in enumerate(engines)
+                if feed_urls is not None or post_groups[idx]
+            )
+        )
+
+    client.report.log()
@@ -0,0 +1,51 @@
+from rich.markup import escape
+from winzig.analysis import Analyzer
+
+SNIPPET_SOURCE_LENGTH = 20_000
+SNIPPET_WORDS = 60
+SNIPPET_CONTEXT_WORDS = 8
+
+
+def make_snippet(
+    text: str,
+    analyzer: Analyzer,
+    terms: set[str],
+    window: int = SNIPPET_WORDS,
+) -> str:
+    words = text.split()
+    matches = []
+    for idx, word in enumerate(words):
+        for term in analyzer(word):
+            if term in terms:
+                matches.append((idx, term))
+                break
+
+    # Pick the window with the most distinct query terms, then the most
+    # matches overall.
+    best_start, best_score = 0, (0, 0)
+    right = 0
+    for left in range(len(matches)):
+        while right < len(matches) and matches[right][0] < matches[left][0] + window:
+            right += 1
+
+        in_window = matches[left:right]
+        score = (len({term for _, term in in_window}), len(in_window))
+        if score > best_score:
+            best_start, best_score = matches[left][0], score
+
+    start = max(0, best_start - SNIPPET_CONTEXT_WORDS) if matches else 0
+    end = min(len(words), start + window)
+    highlighted = {idx for idx, _ in matches}
+
+    snippet = " ".join(
+        f"[b yellow]{escape(words[idx])}[/]"
+        if idx in highlighted
+        else escape(words[idx])
+        for idx in range(start, end)
+    )
+    if start > 0:
+        snippet = "..." + snippet
+    if end < len(words) or len(text) >= SNIPPET_SOURCE_LENGTH:
+        snippet += "..."
+
+    return snippet
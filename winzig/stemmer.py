@@ -0,0 +1,184 @@
+from functools import lru_cache
+
+VOWELS = frozenset("aeiou")
+
+STEP_2_SUFFIXES = (
+    ("ational", "ate"),
+    ("tional", "tion"),
+    ("enci", "ence"),
+    ("anci", "ance"),
+    ("izer", "ize"),
+    ("bli", "ble"),
+    ("alli", "al"),
+    ("entli", "ent"),
+    ("eli", "e"),
+    ("ousli", "ous"),
+    ("ization", "ize"),
+    ("ation", "ate"),
+    ("ator", "ate"),
+    ("alism", "al"),
+    ("iveness", "ive"),
+    ("fulness", "ful"),
+    ("ousness", "ous"),
+    ("aliti", "al"),
+    ("iviti", "ive"),
+    ("biliti", "ble"),
+    ("logi", "log"),
+)
+
+STEP_3_SUFFIXES = (
+    ("icate", "ic"),
+    ("ative", ""),
+    ("alize", "al"),
+    ("iciti", "ic"),
+    ("ical", "ic"),
+    ("ful", ""),
+    ("ness", ""),
+)
+
+STEP_4_SUFFIXES = (
+    "al",
+    "ance",
+    "ence",
+    "er",
+    "ic",
+    "able",
+    "ible",
+    "ant",
+    "ement",
+    "ment",
+    "ent",
+    "ion",
+    "ou",
+    "ism",
+    "ate",
+    "iti",
+    "ous",
+    "ive",
+    "ize",
+)
+
+
+def is_consonant(word: str, i: int) -> bool:
+    if word[i] in VOWELS:
+        return False
+    if word[i] == "y":
+        return i == 0 or not is_consonant(word, i - 1)
+    return True
+
+
+def measure(stem: str) -> int:
+    # Number of vowel-consonant sequences in [C](VC)^m[V].
+    m = 0
+    previous_vowel = False
+    for i in range(len(stem)):
+        consonant = is_consonant(stem, i)
+        if consonant and previous_vowel:
+            m += 1
+        previous_vowel = not consonant
+
+    return m
+
+
+def has_vowel(stem: str) -> bool:
+    return any(not is_consonant(stem, i) for i in range(len(stem)))
+
+
+def ends_double_consonant(word: str) -> bool:
+    return len(word) > 1 and word[-1] == word[-2] and is_consonant(word, len(word) - 1)
+
+
+def ends_cvc(word: str) -> bool:
+    return (
+        len(word) > 2
+        and is_consonant(word, len(word) - 3)
+        and not is_consonant(word, len(word) - 2)
+        and is_consonant(word, len(word) - 1)
+        and word[-1] not in "wxy"
+    )
+
+
+def step_1a(word: str) -> str:
+    if word.endswith("sses"):
+        return word[:-2]
+    if word.endswith("ies"):
+        return word[:-2]
+    if word.endswith("ss"):
+        return word
+    if word.endswith("s"):
+        return word[:-1]
+    return word
+
+
+def step_1b(word: str) -> str:
+    if word.endswith("eed"):
+        return word[:-1] if measure(word[:-3]) > 0 else word
+
+    for suffix in ("ed", "ing"):
+        if word.endswith(suffix) and has_vowel(word[: -len(suffix)]):
+            word = word[: -len(suffix)]
+            break
+    else:
+        return word
+
+    if word.endswith(("at", "bl", "iz")):
+        return word + "e"
+    if ends_double_consonant(word) and word[-1] not in "lsz":
+        return word[:-1]
+    if measure(word) == 1 and ends_cvc(word):
+        return word + "e"
+    return word
+
+
+def step_1c(word: str) -> str:
+    if word.endswith("y") and has_vowel(word[:-1]):
+        return word[:-1] + "i"
+    return word
+
+
+def replace_suffix(word: str, suffixes: tuple[tuple[str, str], ...]) -> str:
+    for suffix, replacement in suffixes:
+        if word.endswith(suffix):
+            stem = word[: -len(suffix)]
+            return stem + replacement if measure(stem) > 0 else word
+    return word
+
+
+def step_4(word: str) -> str:
+    for suffix in STEP_4_SUFFIXES:
+        if word.endswith(suffix):
+            stem = word[: -len(suffix)]
+            if measure(stem) <= 1:
+                return word
+            if suffix == "ion" and not stem.endswith(("s", "t")):
+                return word
+            return stem
+    return word
+
+
+def step_5(word: str) -> str:
+    if word.endswith("e"):
+        stem = word[:-1]
+        m = measure(stem)
+        if m > 1 or (m == 1 and not ends_cvc(stem)):
+            word = stem
+
+    if measure(word) > 1 and ends_double_consonant(word) and word.endswith("l"):
+        word = word[:-1]
+    return word
+
+
+@lru_cache(maxsize=100_000)
+def stem(word: str) -> str:
+    # Porter stemming algorithm, as in the reference C implementation.
+    if len(word) <= 2:
+        return word
+
+    word = step_1a(word)
+    word = step_1b(word)
+    word = step_1c(word)
+    word = replace_suffix(word, STEP_2_SUFFIXES)
+    word = replace_suffix(word, STEP_3_SUFFIXES)
+    word = step_4(word)
+    word = step_5(word)
+    return word
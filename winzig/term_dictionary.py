@@ -0,0 +1,178 @@
+from bisect import bisect_left
+import re
+import threading
+from fnmatch import translate
+from typing import Iterable, Sequence
+
+WILDCARDS = "*?"
+MAX_DISTANCE = 1
+PREFIX_LENGTH = 7
+
+
+def bounded_distance(a: str, b: str, max_distance: int) -> int:
+    # Optimal string alignment distance (Levenshtein plus adjacent
+    # transpositions) that gives up as soon as every cell of a row exceeds
+    # max_distance, returning max_distance + 1 in that case.
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+
+    before = None
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            cost = previous[j - 1] + (char_a != char_b)
+            cost = min(cost, previous[j] + 1, current[j - 1] + 1)
+            if (
+                before is not None
+                and j > 1
+                and char_a == b[j - 2]
+                and a[i - 2] == char_b
+            ):
+                cost = min(cost, before[j - 2] + 1)
+
+            current.append(cost)
+            row_min = min(row_min, cost)
+
+        if row_min > max_distance:
+            return max_distance + 1
+
+        before, previous = previous, current
+
+    return previous[-1] if previous[-1] <= max_distance else max_distance + 1
+
+
+def deletes(term: str, max_distance: int) -> set[str]:
+    results = {term}
+    edits = {term}
+    for _ in range(max_distance):
+        edits = {edit[:i] + edit[i + 1 :] for edit in edits for i in range(len(edit))}
+        results.update(edits)
+
+    return results
+
+
+class TermDictionary:
+    def __init__(
+        self,
+        terms: Sequence[str],
+        frequencies: Sequence[int],
+        max_distance: int = MAX_DISTANCE,
+        prefix_length: int = PREFIX_LENGTH,
+        deletes=None,
+    ) -> None:
+        # Terms must be sorted. Any sequence works, so a compiled segment can
+        # be searched in place, along with the index of deletes it stores.
+        self.terms = terms
+        self.frequencies = frequencies
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+
+        self._deletes = deletes
+        self._deletes_lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.terms)
+
+    def __contains__(self, term: str) -> bool:
+        idx = bisect_left(self.terms, term)
+        return idx < len(self.terms) and self.terms[idx] == term
+
+    def _scan(self, prefix: str):
+        idx = bisect_left(self.terms, prefix)
+        while idx < len(self.terms) and self.terms[idx].startswith(prefix):
+            yield idx
+            idx += 1
+
+    def _most_frequent(self, indexes: Iterable[int], limit: int) -> list[str]:
+        ranked = sorted(indexes, key=lambda idx: -self.frequencies[idx])
+        return [self.terms[idx] for idx in ranked[:limit]]
+
+    def prefix(
+        self, prefix: str, limit: int = 10, scan_limit: int = 10_000
+    ) -> list[str]:
+        if not prefix:
+            return []
+
+        indexes = []
+        for idx in self._scan(prefix):
+            indexes.append(idx)
+            if len(indexes) >= scan_limit:
+                break
+
+        return self._most_frequent(indexes, limit)
+
+    def wildcard(
+        self, pattern: str, limit: int = 10, scan_limit: int = 10_000
+    ) -> list[str]:
+        # Only patterns with a literal prefix are supported, leading wildcards
+        # would need a full scan of the vocabulary.
+        literal = pattern
+        for idx, char in enumerate(pattern):
+            if char in WILDCARDS:
+                literal = pattern[:idx]
+                break
+
+        if not literal:
+            return []
+
+        if pattern == literal + "*":
+            return self.prefix(literal, limit, scan_limit)
+
+        match = re.compile(translate(pattern)).match
+        indexes = []
+        for scanned, idx in enumerate(self._scan(literal)):
+            if scanned >= scan_limit:
+                break
+
+            if match(self.terms[idx]):
+                indexes.append(idx)
+
+        return self._most_frequent(indexes, limit)
+
+    def _build_deletes(self) -> dict[str, tuple[int, ...]]:
+        # Tuples of ints are untracked by the garbage collector, unlike lists,
+        # so millions of them don't make every full collection stall the event
+        # loop while this runs in a worker thread.
+        index = {}
+        for idx, term in enumerate(self.terms):
+            for edit in deletes(term[: self.prefix_length], self.max_distance):
+                index[edit] = index.get(edit, ()) + (idx,)
+
+        return index
+
+    def fuzzy(self, term: str, limit: int = 10) -> list[tuple[str, int]]:
+        # SymSpell-style lookup: terms sharing a delete of their prefix with
+        # the query are candidates, which are then verified against the
+        # real edit distance. Lookups run in worker threads, so the index of
+        # deletes is only built by the first one.
+        with self._deletes_lock:
+            if self._deletes is None:
+                self._deletes = self._build_deletes()
+
+        candidates = set()
+        for edit in deletes(term[: self.prefix_length], self.max_distance):
+            candidates.update(self._deletes.get(edit, ()))
+
+        matches = []
+        for idx in candidates:
+            distance = bounded_distance(term, self.terms[idx], self.max_distance)
+            if distance <= self.max_distance:
+                matches.append((distance, -self.frequencies[idx], idx))
+
+        matches.sort()
+        return [(self.terms[idx], distance) for distance, _, idx in matches[:limit]]
+
+
+def build_term_dictionary(
+    terms: Iterable[tuple[str, int]], **options
+) -> TermDictionary:
+    # Terms are unique and usually come sorted from the database already,
+    # which sorted() only needs a single pass to check.
+    pairs = sorted(terms)
+    return TermDictionary(
+        [term for term, _ in pairs],
+        [frequency for _, frequency in pairs],
+        **options,
+    )
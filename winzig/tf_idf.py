@@ -1,16 +1,24 @@
+from collections import Counter
+from itertools import batched
 from math import log
-from sqlalchemy import delete, func, select
+from sqlalchemy import delete, func, select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 from winzig.models import Post, Keyword, Occurrence
-from winzig.console import console
+from winzig.profiling import traced
+from winzig.settings import get_setting, set_setting
+from winzig.console import console, shared_status
 
 
+@traced("calculate_tf_idfs")
 async def calculate_tf_idfs(session: AsyncSession):
     statement = select(func.count()).select_from(Post)
     result = await session.execute(statement)
     total_posts = result.scalar()
+    # Bumped even without posts, since the previous scores are gone.
+    await bump_index_generation(session)
     if not total_posts:
         console.log("[red bold]Error[/red bold]: No posts found")
+        await session.commit()
         return
 
     statement = select(Occurrence.word, func.sum(Occurrence.count)).group_by(
@@ -25,6 +33,71 @@ async def calculate_tf_idfs(session: AsyncSession):
     await session.commit()
 
 
+async def update_tf_idfs(
+    session: AsyncSession, words: Counter, previous_total: int, total: int
+):
+    # Scores are log(total / (frequency + 1)), so a change in the number of
+    # posts shifts every score by the same amount, and only the words in the
+    # new posts need their frequency updated. Words of removed posts come
+    # with negative counts.
+    if not words and total == previous_total:
+        return
+
+    if not total:
+        await session.execute(delete(Keyword))
+        await bump_index_generation(session)
+        return
+
+    if previous_total and total != previous_total:
+        await session.execute(
+            update(Keyword).values(score=Keyword.score + log(total / previous_total))
+        )
+
+    existing = {}
+    for chunk in batched(words, 500):
+        statement = select(Keyword.keyword, Keyword.id, Keyword.frequency).where(
+            Keyword.keyword.in_(chunk)
+        )
+        results = await session.execute(statement)
+        existing.update(
+            (word, (keyword_id, frequency)) for word, keyword_id, frequency in results
+        )
+
+    updates = []
+    for word, count in words.items():
+        if word not in existing:
+            if count > 0:
+                session.add(
+                    Keyword(
+                        keyword=word, score=log(total / (count + 1)), frequency=count
+                    )
+                )
+            continue
+
+        keyword_id, frequency = existing[word]
+        frequency += count
+        updates.append(
+            {
+                "id": keyword_id,
+                "score": log(total / (frequency + 1)),
+                "frequency": frequency,
+            }
+        )
+
+    if updates:
+        await session.execute(update(Keyword), updates)
+        await session.execute(delete(Keyword).where(Keyword.frequency <= 0))
+
+    await bump_index_generation(session)
+
+
+async def bump_index_generation(session: AsyncSession):
+    # Compiled segments record the generation they were built from, so they
+    # stop being used as soon as the scores change.
+    generation = int(await get_setting(session, "index_generation") or 0)
+    await set_setting(session, "index_generation", str(generation + 1))
+
+
 async def delete_old_scores(session: AsyncSession):
     statement = delete(Keyword)
     await session.execute(statement)
@@ -36,7 +109,7 @@ async def recalculate_tf_idf(session: AsyncSession):
     await delete_old_scores(session)
 
     console.log("[green bold]SUCCESS[/green bold]: Previous TF-IDF scores deleted")
-    with console.status("Calculating tf-idf scores...", spinner="earth"):
+    with shared_status("Calculating tf-idf scores..."):
         await calculate_tf_idfs(session)
 
     console.log("[green bold]SUCCESS[/green bold]: TF-IDF scores calculated")
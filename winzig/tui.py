@@ -1,39 +1,38 @@
-from sqlalchemy import select
+import asyncio
+from rich.markup import escape
 from textual import work
 from textual.reactive import reactive
 from textual.app import App, ComposeResult
 from textual.containers import Grid, VerticalScroll
 from textual.validation import Number
 from textual.widgets import Button, Header, Footer, Input, RadioSet, Static, RadioButton
-from winzig.models import Post
-from winzig.search_engine import SearchEngine
-from winzig.utils import get_top_urls
 
 
 class ResultCard(Static):
-    def __init__(self, url, content, *args, **kwargs):
+    def __init__(self, url, snippet, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.MAX_CONTENT_LENGTH = 512
-
         self.url = url
-        self.content = content
+        self.snippet = snippet
 
     def compose(self) -> ComposeResult:
-        yield Static(f"[b]{self.url}[/b]")
-        yield Static(
-            f"{self.content[:self.MAX_CONTENT_LENGTH] + "..." if len(self.content) > self.MAX_CONTENT_LENGTH else self.content}"
-        )
+        yield Static(f"[b]{escape(self.url)}[/b]")
+        yield Static(self.snippet)
 
 
 class TuiApp(App):
     query_search = reactive('')
     number_results = reactive(10)
-    variant=reactive('BM11')
+    variant = reactive("BM25")
+
+    DEBOUNCE_DELAY = 0.15
 
-    def __init__(self, session, k1, b, *args, **kwargs):
+    def __init__(self, search_engine, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.session = session
-        self.search_engine = SearchEngine(self.session, filters={}, k1=k1, b=b)
+        self.search_engine = search_engine
+
+        self._debounce_timer = None
+        self._search_generation = 0
+        self._search_lock = asyncio.Lock()
 
     TITLE = "winzig"
     CSS_PATH = "./tui.tcss"
@@ -65,59 +64,93 @@ class TuiApp(App):
             pass
 
     async def on_input_submitted(self, _: Input.Submitted) -> None:
-        if self.query_search:
+        if self._debounce_timer:
+            self._debounce_timer.stop()
+
+        if self.query_search and self.number_results > 0:
             self.search()
         else:
             self.clear_search_results()
 
     async def on_input_changed(self, _: Input.Changed) -> None:
-        self.clear_search_results()
         self.query_search = self.query_one(".query").value
         try:
             value = self.query_one(".number_results").value
             if value:
-                self.number_of_results = int(value)
+                self.number_results = int(value)
             else:
-                self.number_of_results = 0
+                self.number_results = 0
         except (ValueError, AttributeError):
-            self.number_of_results = 0
+            self.number_results = 0
+
+        self.schedule_search()
 
     def on_radio_set_changed(self, event: RadioSet.Changed) -> None:
-        self.variant = event.pressed.label
+        self.variant = str(event.pressed.label)
+        self.schedule_search()
 
-    @work(exclusive=True)
-    async def search(self) -> None:
-        results_container = self.query_one("VerticalScroll")
-        results_container.loading = True
+    def schedule_search(self) -> None:
+        # Every change invalidates the searches already running, and the new
+        # one only starts once the input has been idle for DEBOUNCE_DELAY.
+        self._search_generation += 1
+        if self._debounce_timer:
+            self._debounce_timer.stop()
 
-        if self.variant == 'BM25':
-            self.search_engine.b = 0.75
-        elif self.variant == 'BM15':
-            self.search_engine.b = 0
-        else:
-            self.search_engine.b = 1
+        if not self.query_search.strip() or self.number_results < 1:
+            self.clear_search_results()
+            return
 
-        search_results = await self.search_engine.search(self.query_search)
-        search_results = get_top_urls(search_results, self.number_results)
+        self._debounce_timer = self.set_timer(self.DEBOUNCE_DELAY, self.search)
+
+    @work(group="search")
+    async def search(self) -> None:
+        # Cancelling a search while it waits on the database leaves the
+        # session shared by every search unusable, so searches are shielded
+        # and stale results are discarded by generation instead.
+        generation = self._search_generation
+        results = await asyncio.shield(self.run_search(generation))
+        if results is None or generation != self._search_generation:
+            return
 
         self.clear_search_results()
-        await self.mount_search_results(search_results)
+        self.mount_search_results(*results)
+
+    async def run_search(
+        self, generation: int
+    ) -> tuple[dict[str, float], dict[str, str]] | None:
+        # The session can only run one statement at a time, so searches wait
+        # for the previous one, and are skipped if they went stale meanwhile.
+        async with self._search_lock:
+            if generation != self._search_generation:
+                return None
+
+            if self.variant == "BM25":
+                self.search_engine.b = 0.75
+            elif self.variant == "BM15":
+                self.search_engine.b = 0
+            else:
+                self.search_engine.b = 1
+
+            search_results = await self.search_engine.search(
+                self.query_search, self.number_results
+            )
+            if generation != self._search_generation:
+                return None
+
+            snippets = await self.search_engine.snippets(
+                self.query_search, list(search_results)
+            )
+            return search_results, snippets
 
     def clear_search_results(self) -> None:
         result_cards = self.query("ResultCard")
         for card in result_cards:
             card.remove()
 
-    async def mount_search_results(self, search_results: dict[str, float]) -> None:
+    def mount_search_results(
+        self, search_results: dict[str, float], snippets: dict[str, str]
+    ) -> None:
         results_container = self.query_one("VerticalScroll")
-        for result, _  in search_results.items():
-            content = await self.session.execute(
-                select(Post.content).where(Post.url == result)
-            )
-            results_container.mount(
-                ResultCard(
-                    result,
-                    content.scalar(),
-                )
-            )
-            results_container.loading = False
+        results_container.mount_all(
+            ResultCard(result, snippets.get(result, "")) for result in search_results
+        )
@@ -1,5 +1,6 @@
 import string
 import emoji
+from winzig.profiling import traced
 
 emojis = set(emoji.EMOJI_DATA.keys())
 punctuation_and_emojis = set(string.punctuation + "“”’‘¶■▌▲▼└│─√©" + "".join(emojis))
@@ -14,12 +15,14 @@ def update_url_scores(old: dict[str, float], new: dict[str, float]) -> dict[str,
     return old
 
 
+@traced("normalize_text")
 def normalize_text(text: str) -> str:
     normalized = text.translate(translation_table).lower()
     normalized = " ".join(normalized.split())
     return normalized
 
 
+@traced("get_top_urls")
 def get_top_urls(scores_dict: dict, n: int):
     sorted_urls = sorted(scores_dict.items(), key=lambda x: x[1], reverse=True)
     top_n_dict = dict(sorted_urls[:n])